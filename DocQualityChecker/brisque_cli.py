@@ -1,6 +1,28 @@
+import os
 import sys
 import cv2
-from brisque import BRISQUE
+
+# brisque_native.py is copied next to this script on build; in the source
+# tree it lives in tools/.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+for _dir in (SCRIPT_DIR, os.path.join(SCRIPT_DIR, "..", "tools")):
+    if _dir not in sys.path:
+        sys.path.append(_dir)
+
+try:
+    from brisque_native import BrisqueModel
+except ImportError:
+    BrisqueModel = None
+
+
+def score_image(img):
+    if BrisqueModel is not None:
+        return BrisqueModel.load().score(img)
+    from brisque import BRISQUE
+
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return BRISQUE().score(rgb)
+
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -10,6 +32,5 @@ if __name__ == "__main__":
     if img is None:
         print("nan")
     else:
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        score = BRISQUE().score(rgb)
+        score = score_image(img)
         print(float(score))
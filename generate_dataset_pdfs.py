@@ -2,12 +2,24 @@
 """Generate PDF files from the sample dataset images.
 
 This script collects all JPEG and PNG images under ``docs/dataset_samples``
-and creates one PDF per subdirectory. The resulting files are saved in the
-``generated_pdfs`` folder or in a custom directory passed via command line.
+(or ``--src``) and creates one PDF per subdirectory. The resulting files are
+saved in the ``generated_pdfs`` folder or in a custom directory passed via
+command line.
+
+PDFs are written page by page: each image is opened, encoded and appended
+to the file before the next one is read, so memory stays bounded by a single
+page whatever the folder size. JPEG pages that need no resampling are
+embedded as-is (``DCTDecode``) without being decoded. Folders are converted
+in parallel with ``--workers`` processes.
+
+With ``--dpi`` every page is fitted to A4 and images finer than the target
+resolution are downscaled (JPEG sources through a reduced-size decode) and
+recompressed as JPEG with ``--jpeg-quality``.
 
 Usage::
 
     python generate_dataset_pdfs.py [output_dir]
+    python generate_dataset_pdfs.py generated_pdfs --src data/midv500 --workers 8 --dpi 150
 
 Dependencies::
 
@@ -15,15 +27,22 @@ Dependencies::
 """
 from __future__ import annotations
 
+import argparse
+import multiprocessing as mp
 import os
-import sys
-from typing import Iterable
+import time
+from io import BytesIO
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
 
 from PIL import Image
 
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_DIR = os.path.join(ROOT_DIR, "docs", "dataset_samples")
 
+# A4 in inches (portrait).
+A4_INCHES = (8.27, 11.69)
+DEFAULT_JPEG_QUALITY = 90
+
 
 def list_images(folder: str) -> Iterable[str]:
     """Yield absolute paths of JPEG/PNG images in ``folder`` sorted by name."""
@@ -32,35 +51,181 @@ def list_images(folder: str) -> Iterable[str]:
             yield os.path.join(folder, name)
 
 
-def images_to_pdf(images: Iterable[str], output: str) -> bool:
-    """Save ``images`` into a multipage PDF located at ``output``."""
-    pages = [Image.open(path).convert("RGB") for path in images]
-    if not pages:
-        return False
-    first, rest = pages[0], pages[1:]
-    first.save(output, save_all=True, append_images=rest)
-    for img in pages:
-        img.close()
-    return True
-
-
-def convert_dataset(out_dir: str) -> None:
+class StreamingPdfWriter:
+    """Minimal PDF writer that appends one image page at a time.
+
+    Objects 1 (catalog) and 2 (page tree) are written by :meth:`close`, once
+    all pages are known; everything else goes to disk as soon as it is added.
+    """
+
+    def __init__(self, output: str):
+        self._fh: BinaryIO = open(output, "wb")
+        self._fh.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 3
+        self._pages: List[int] = []
+
+    def __enter__(self) -> "StreamingPdfWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def _object(self, obj_id: int, body: bytes, stream: Optional[bytes] = None) -> None:
+        self._offsets[obj_id] = self._fh.tell()
+        self._fh.write(f"{obj_id} 0 obj\n".encode("ascii") + body)
+        if stream is not None:
+            self._fh.write(b"\nstream\n")
+            self._fh.write(stream)
+            self._fh.write(b"\nendstream")
+        self._fh.write(b"\nendobj\n")
+
+    def add_page(self, jpeg: bytes, width: int, height: int, gray: bool, page_size: Tuple[float, float]) -> None:
+        """Append a page showing ``jpeg`` (``width`` x ``height`` px) over ``page_size`` points."""
+        image_id, content_id, page_id = self._next_id, self._next_id + 1, self._next_id + 2
+        self._next_id += 3
+        colorspace = "/DeviceGray" if gray else "/DeviceRGB"
+        self._object(
+            image_id,
+            (f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+             f"/ColorSpace {colorspace} /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>").encode("ascii"),
+            jpeg,
+        )
+        page_w, page_h = page_size
+        content = f"q {page_w:.2f} 0 0 {page_h:.2f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._object(content_id, f"<< /Length {len(content)} >>".encode("ascii"), content)
+        self._object(
+            page_id,
+            (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w:.2f} {page_h:.2f}] "
+             f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>").encode("ascii"),
+        )
+        self._pages.append(page_id)
+
+    def close(self) -> None:
+        if self._fh.closed:
+            return
+        kids = " ".join(f"{p} 0 R" for p in self._pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode("ascii"))
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self._fh.tell()
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            lines.append(f"{self._offsets[obj_id]:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self._fh.write("".join(lines).encode("ascii"))
+        self._fh.close()
+
+
+def prepare_page(path: str, dpi: Optional[float] = None,
+                 quality: int = DEFAULT_JPEG_QUALITY) -> Tuple[bytes, int, int, bool, Tuple[float, float]]:
+    """Return ``(jpeg bytes, width, height, gray, page size in points)`` for one image.
+
+    Without ``dpi`` the page is one point per pixel (as Pillow's PDF writer
+    does). With ``dpi`` the page is A4 in the image orientation and the image
+    is downscaled when its resolution on the page exceeds ``dpi``.
+    """
+    with Image.open(path) as im:
+        width, height = im.size
+        size = (width, height)
+        page_size = (float(width), float(height))
+        if dpi:
+            page_in = A4_INCHES if height >= width else A4_INCHES[::-1]
+            inches_per_px = min(page_in[0] / width, page_in[1] / height)
+            page_size = (width * inches_per_px * 72.0, height * inches_per_px * 72.0)
+            if 1.0 / inches_per_px > dpi:
+                scale = dpi * inches_per_px
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        gray = im.mode in ("1", "L", "LA", "I", "I;16", "F")
+        if im.format == "JPEG" and im.mode in ("RGB", "L") and size == (width, height):
+            with open(path, "rb") as fh:
+                return fh.read(), width, height, im.mode == "L", page_size
+        if im.format == "JPEG" and size != (width, height):
+            # Decode at the smallest DCT scale that still covers ``size``.
+            im.draft(im.mode, size)
+        page = im.convert("L" if gray else "RGB")
+        if page.size != size:
+            page = page.resize(size, Image.LANCZOS)
+        buf = BytesIO()
+        page.save(buf, "JPEG", quality=quality)
+        page.close()
+        return buf.getvalue(), size[0], size[1], gray, page_size
+
+
+def images_to_pdf(images: Iterable[str], output: str, dpi: Optional[float] = None,
+                  quality: int = DEFAULT_JPEG_QUALITY) -> int:
+    """Save ``images`` into a multipage PDF located at ``output``.
+
+    Pages are streamed to disk one at a time. Returns the number of pages
+    written; no file is left behind when ``images`` is empty.
+    """
+    with StreamingPdfWriter(output) as writer:
+        for path in images:
+            data, width, height, gray, page_size = prepare_page(path, dpi, quality)
+            writer.add_page(data, width, height, gray, page_size)
+    if not len(writer):
+        os.remove(output)
+    return len(writer)
+
+
+def _convert_folder(job: Tuple[str, str, Optional[float], int]) -> dict:
+    folder, out_pdf, dpi, quality = job
+    images = list(list_images(folder))
+    start = time.time()
+    pages = images_to_pdf(images, out_pdf, dpi, quality) if images else 0
+    return {
+        "folder": folder,
+        "pdf": out_pdf if pages else None,
+        "pages": pages,
+        "bytes_in": sum(os.path.getsize(p) for p in images),
+        "bytes_out": os.path.getsize(out_pdf) if pages else 0,
+        "seconds": time.time() - start,
+    }
+
+
+def convert_dataset(out_dir: str, src_dir: str = DATASET_DIR, workers: int = 1, dpi: Optional[float] = None,
+                    quality: int = DEFAULT_JPEG_QUALITY) -> List[dict]:
+    """Create one PDF per subfolder of ``src_dir``; returns per-folder statistics."""
     os.makedirs(out_dir, exist_ok=True)
-    for item in os.listdir(DATASET_DIR):
-        folder = os.path.join(DATASET_DIR, item)
-        if not os.path.isdir(folder):
-            continue
-        images = list(list_images(folder))
-        if not images:
-            continue
-        out_pdf = os.path.join(out_dir, f"{item}.pdf")
-        if images_to_pdf(images, out_pdf):
-            print(f"Created {out_pdf}")
+    jobs = []
+    for item in sorted(os.listdir(src_dir)):
+        folder = os.path.join(src_dir, item)
+        if os.path.isdir(folder):
+            jobs.append((folder, os.path.join(out_dir, f"{item}.pdf"), dpi, quality))
+    if workers > 1 and len(jobs) > 1:
+        with mp.Pool(min(workers, len(jobs))) as pool:
+            results = list(pool.imap_unordered(_convert_folder, jobs))
+    else:
+        results = [_convert_folder(job) for job in jobs]
+    for res in results:
+        if res["pdf"]:
+            print(f"Created {res['pdf']} ({res['pages']} pages)")
+    return results
 
 
 def main() -> None:
-    out_dir = sys.argv[1] if len(sys.argv) > 1 else "generated_pdfs"
-    convert_dataset(out_dir)
+    parser = argparse.ArgumentParser(description="Create one multipage PDF per dataset folder")
+    parser.add_argument("out_dir", nargs="?", default="generated_pdfs")
+    parser.add_argument("--src", default=DATASET_DIR, help="Folder whose subfolders become PDFs")
+    parser.add_argument("--workers", type=int, default=1, help="Folders converted in parallel")
+    parser.add_argument("--dpi", type=float, default=None, help="Fit pages to A4 and downscale above this DPI")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY,
+                        help="Quality of recompressed pages")
+    args = parser.parse_args()
+
+    start = time.time()
+    results = convert_dataset(args.out_dir, args.src, args.workers, args.dpi, args.jpeg_quality)
+    elapsed = time.time() - start
+    pages = sum(r["pages"] for r in results)
+    bytes_in = sum(r["bytes_in"] for r in results)
+    bytes_out = sum(r["bytes_out"] for r in results)
+    print(f"{sum(1 for r in results if r['pdf'])} PDFs, {pages} pages in {elapsed:.2f}s "
+          f"({pages / elapsed if elapsed > 0 else 0:.1f} pages/s, "
+          f"{bytes_in / 1e6 / elapsed if elapsed > 0 else 0:.1f} MB/s of images)")
+    print(f"Input {bytes_in / 1e6:.1f} MB, output {bytes_out / 1e6:.1f} MB")
     print("Done")
 
 
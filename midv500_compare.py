@@ -4,9 +4,11 @@ import json
 import random
 import subprocess
 from pathlib import Path
-from statistics import fmean
+
+import numpy as np
 
 from python_quality import check_quality
+from tools.compute_metrics_py import MetricsBatch
 
 NUMERIC_METRICS = [
     "BlurScore",
@@ -48,29 +50,28 @@ def main() -> None:
     random.seed(0)
     sample = random.sample(images, 100)
 
-    records: list[tuple[dict, dict]] = []
+    py_batch = MetricsBatch(len(sample), NUMERIC_METRICS, BOOL_METRICS, extra_columns=())
+    net_batch = MetricsBatch(len(sample), NUMERIC_METRICS, BOOL_METRICS, extra_columns=())
     for img in sample:
-        py_metrics = check_quality(str(img))
-        net_metrics = run_dotnet(img)
-        records.append((py_metrics, net_metrics))
+        py_batch.append(check_quality(str(img)))
+        net_batch.append(run_dotnet(img))
 
     rows: list[list[str | float]] = []
     for metric in NUMERIC_METRICS:
-        py_vals = [r[0][metric] for r in records]
-        net_vals = [r[1][metric] for r in records]
-        py_mean = fmean(py_vals)
-        net_mean = fmean(net_vals)
-        diffs = [abs(p - n) / max(abs(p), abs(n), 1e-6) * 100 for p, n in zip(py_vals, net_vals)]
-        delta = fmean(diffs)
+        py_vals = py_batch.column(metric)
+        net_vals = net_batch.column(metric)
+        py_mean = float(py_vals.mean())
+        net_mean = float(net_vals.mean())
+        scale = np.maximum(np.maximum(np.abs(py_vals), np.abs(net_vals)), 1e-6)
+        delta = float((np.abs(py_vals - net_vals) / scale * 100).mean())
         rows.append([metric, py_mean, net_mean, delta])
 
     for metric in BOOL_METRICS:
-        py_vals = [bool(r[0][metric]) for r in records]
-        net_vals = [bool(r[1][metric]) for r in records]
-        py_mean = fmean(py_vals)
-        net_mean = fmean(net_vals)
-        disagreement = [p ^ n for p, n in zip(py_vals, net_vals)]
-        delta = fmean(disagreement) * 100
+        py_vals = py_batch.column(metric)
+        net_vals = net_batch.column(metric)
+        py_mean = float(py_vals.mean())
+        net_mean = float(net_vals.mean())
+        delta = float((py_vals ^ net_vals).mean() * 100)
         rows.append([metric, py_mean, net_mean, delta])
 
     print("| Metric / Flag | Python (μ) | .NET (μ) | Δ% (medio) |")
@@ -1,25 +1,158 @@
 from __future__ import annotations
 import math
-from tools.compute_metrics_py import compute_metrics
+import statistics
+import time
+from typing import Iterable
 
-def check_quality(path: str) -> dict:
+import cv2
+
+from tools.compute_metrics_py import (
+    METRIC_CHECKS,
+    THRESHOLDS,
+    compute_metrics,
+    document_roi,
+    failed_checks,
+    read_image,
+)
+
+# Cost of each gate check in milliseconds per megapixel, seeded with values
+# measured on the sample images and refined with every gated evaluation.
+CHECK_COSTS_MS_PER_MP = {
+    "histogram": 0.5,
+    "banding": 1.0,
+    "noise": 1.4,
+    "glare": 2.2,
+    "color_dominance": 2.5,
+    "blur": 10.0,
+    "brisque": 70.0,
+}
+# Weight given to a new measurement when refreshing the cost estimates.
+COST_SMOOTHING = 0.2
+
+
+def gate_order() -> list[str]:
+    """Return the gate checks sorted by ascending measured cost."""
+    return sorted(CHECK_COSTS_MS_PER_MP, key=CHECK_COSTS_MS_PER_MP.__getitem__)
+
+
+def _update_cost(check: str, elapsed_ms: float, megapixels: float) -> None:
+    measured = elapsed_ms / max(megapixels, 1e-6)
+    previous = CHECK_COSTS_MS_PER_MP[check]
+    CHECK_COSTS_MS_PER_MP[check] = previous + COST_SMOOTHING * (measured - previous)
+
+
+def _gate_failures(res: dict, thresholds: dict) -> list[str]:
+    failed = failed_checks(res)
+    banding = res.get("BandingScore")
+    if banding is not None and not math.isnan(banding) and banding > thresholds["BandingThreshold"]:
+        failed.append("HasBanding")
+    brisque = res.get("BrisqueScore")
+    if brisque is not None and not math.isnan(brisque) and brisque > thresholds["BrisqueMax"]:
+        failed.append("BrisqueScore")
+    return failed
+
+
+def measure_check_costs(paths: Iterable[str]) -> dict:
+    """Time every gate check on ``paths`` and store the median cost per megapixel."""
+    samples: dict[str, list[float]] = {name: [] for name in CHECK_COSTS_MS_PER_MP}
+    for path in paths:
+        img = read_image(path)
+        if img is None:
+            continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        megapixels = img.shape[0] * img.shape[1] / 1e6
+        for name in samples:
+            start = time.perf_counter()
+            METRIC_CHECKS[name](img, gray, THRESHOLDS)
+            samples[name].append((time.perf_counter() - start) * 1000.0 / megapixels)
+    for name, values in samples.items():
+        if values:
+            CHECK_COSTS_MS_PER_MP[name] = statistics.median(values)
+    return dict(CHECK_COSTS_MS_PER_MP)
+
+
+def _check_gate(path: str, thresholds: dict, brisque: bool = True, roi: bool = False) -> dict:
+    start = time.perf_counter()
+    img = read_image(path)
+    if img is None:
+        raise ValueError(f"Unable to read image: {path}")
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if roi:
+        box = document_roi(gray)
+        if box is not None:
+            x, y, w, h = box
+            img = img[y:y + h, x:x + w]
+            gray = gray[y:y + h, x:x + w]
+    megapixels = img.shape[0] * img.shape[1] / 1e6
+
+    res: dict = {}
+    order = [name for name in gate_order() if brisque or name != "brisque"]
+    run: list[str] = []
+    failed: list[str] = []
+    for name in order:
+        check_start = time.perf_counter()
+        res.update(METRIC_CHECKS[name](img, gray, thresholds))
+        _update_cost(name, (time.perf_counter() - check_start) * 1000.0, megapixels)
+        run.append(name)
+        failed = _gate_failures(res, thresholds)
+        if failed:
+            break
+
+    skipped = order[len(run):]
+    res["Passed"] = not failed
+    res["FailedCheck"] = run[-1] if failed else None
+    res["FailedFlags"] = failed
+    res["ChecksRun"] = run
+    res["ElapsedMs"] = (time.perf_counter() - start) * 1000.0
+    res["TimeSavedMs"] = sum(CHECK_COSTS_MS_PER_MP[name] for name in skipped) * megapixels
+    return res
+
+
+def check_quality(
+    path: str,
+    mode: str = "full",
+    thresholds: dict | None = None,
+    brisque: bool = True,
+    roi: bool = False,
+) -> dict:
     """Compute quality metrics for the given image.
 
     Parameters
     ----------
     path: str
         Path to the image file.
+    mode: str
+        ``"full"`` computes every metric. ``"gate"`` runs the checks in
+        ascending measured cost (histogram first, BRISQUE last) and stops at
+        the first failing flag.
+    thresholds: dict, optional
+        Overrides for :data:`tools.compute_metrics_py.THRESHOLDS`.
+    brisque: bool
+        When false BRISQUE is skipped (``BrisqueScore`` is NaN) and its
+        model is never loaded.
+    roi: bool
+        When true the metrics are computed on the detected document region
+        only (see :func:`tools.compute_metrics_py.document_roi`).
 
     Returns
     -------
     dict
-        Dictionary of quality metrics and flags.
+        Dictionary of quality metrics and flags. In ``"gate"`` mode only the
+        metrics that were evaluated are present, together with ``Passed``,
+        ``FailedCheck``, ``FailedFlags``, ``ChecksRun`` and the estimated
+        ``TimeSavedMs`` of the skipped checks.
     """
-    res = compute_metrics(path)
+    t = {**THRESHOLDS, **(thresholds or {})}
+    if mode == "gate":
+        return _check_gate(path, t, brisque, roi)
+    if mode != "full":
+        raise ValueError(f"Unknown mode: {mode}")
+
+    res = compute_metrics(path, thresholds=t, brisque=brisque, roi=roi)
     # Ensure HasBanding flag exists using same threshold as .NET (0.5)
     banding = res.get("BandingScore")
     if banding is not None and not math.isnan(banding):
-        res["HasBanding"] = bool(banding > 0.5)
+        res["HasBanding"] = bool(banding > t["BandingThreshold"])
     else:
         res["HasBanding"] = False
     res.pop("path", None)
@@ -0,0 +1,286 @@
+"""BRISQUE quality score implemented with OpenCV and NumPy.
+
+Same features and pre-trained SVR model as the ``brisque`` package, without
+its per-image Python overhead:
+
+* MSCN coefficients use ``cv2.GaussianBlur`` (7x7, sigma 7/6, zero border)
+  on a float32 gray image instead of ``scipy.signal.convolve2d`` in float64;
+* the AGGD shape parameter is read from a precomputed table of
+  ``Gamma(2/a)^2 / (Gamma(1/a) * Gamma(3/a))`` by interpolation instead of
+  calling ``scipy.optimize.root`` for each of the 10 fits per image;
+* the RBF SVR is evaluated as one matrix product for a whole batch of
+  feature vectors instead of one libsvm call per image.
+
+The model (``svm.txt`` and ``normalize.pickle``) is read from the installed
+``brisque`` package, whose code is never imported.
+
+Tolerance: on photographs (the ``skimage.data`` images as PNG) scores are
+within ``SCORE_TOLERANCE`` (0.5 points, typically < 0.05) of the package.
+Images with exactly flat areas (synthetic pages, heavy JPEG blocking) can
+differ by a few points: in those areas the package's float64 convolution
+leaves round-off of random sign that its AGGD fit counts as signal, whereas
+here it is snapped to zero (``FLAT_EPSILON``). ``--compare`` reports the
+differences on any sample list.
+
+Usage::
+
+    python tools/brisque_native.py --sample data/sample_50.txt
+    python tools/brisque_native.py --sample data/sample_50.txt --compare
+"""
+import argparse
+import importlib.util
+import math
+import os
+import pickle
+import sys
+import time
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+
+# Expected maximum |difference| from the ``brisque`` package on photographs.
+SCORE_TOLERANCE = 0.5
+
+KERNEL_SIZE = 7
+KERNEL_SIGMA = 7 / 6
+MSCN_C = 1 / 255
+# skimage.color.rgb2gray weights, in BGR order.
+GRAY_WEIGHTS = np.array([[0.0721, 0.7154, 0.2125]], dtype=np.float32)
+NUM_FEATURES = 36
+# |pixel - local mean| below this is float32 round-off of a flat region.
+FLAT_EPSILON = 1e-6
+
+
+@lru_cache(maxsize=1)
+def _alpha_table() -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(rho, alpha)`` with ``rho(alpha)`` increasing."""
+    alpha = np.geomspace(0.05, 20.0, 20000)
+    rho = np.array([math.exp(2 * math.lgamma(2 / a) - math.lgamma(1 / a) - math.lgamma(3 / a)) for a in alpha])
+    return rho, alpha
+
+
+def to_gray(img: np.ndarray) -> np.ndarray:
+    """Float32 luminance in [0, 1] of a BGR(A) or gray uint8 image."""
+    scale = 1 / 255 if img.dtype == np.uint8 else 1.0
+    if img.ndim == 2:
+        return img.astype(np.float32) * np.float32(scale)
+    bgr = img[:, :, :3].astype(np.float32) * np.float32(scale)
+    return cv2.transform(bgr, GRAY_WEIGHTS)
+
+
+def mscn(gray: np.ndarray) -> np.ndarray:
+    """Mean subtracted contrast normalised coefficients."""
+    ksize = (KERNEL_SIZE, KERNEL_SIZE)
+    mu = cv2.GaussianBlur(gray, ksize, KERNEL_SIGMA, borderType=cv2.BORDER_CONSTANT)
+    mu_sq = cv2.GaussianBlur(cv2.multiply(gray, gray), ksize, KERNEL_SIGMA, borderType=cv2.BORDER_CONSTANT)
+    sigma = cv2.sqrt(cv2.absdiff(cv2.multiply(mu, mu), mu_sq))
+    diff = cv2.subtract(gray, mu)
+    # Flat regions are exactly zero in float64; drop float32 round-off there
+    # so it is not counted on either side of the AGGD fit.
+    diff[np.abs(diff) < FLAT_EPSILON] = 0
+    return cv2.divide(diff, cv2.add(sigma, MSCN_C))
+
+
+def aggd_fit(x: np.ndarray) -> Tuple[float, float, float, float]:
+    """Asymmetric generalised Gaussian fit: ``(alpha, mean, sigma_l, sigma_r)``."""
+    # cv2.norm accumulates in double and releases the GIL.
+    n = x.size
+    sq_sum = cv2.norm(x, cv2.NORM_L2SQR)
+    left = np.minimum(x, 0)
+    left_sq = cv2.norm(left, cv2.NORM_L2SQR)
+    n_left = cv2.countNonZero(left)
+    right_sq = sq_sum - left_sq
+    n_right = n - n_left
+    abs_mean = cv2.norm(x, cv2.NORM_L1) / n
+
+    # An empty side gives NaN features, as in the brisque package.
+    sigma_l = math.sqrt(left_sq / n_left) if n_left else math.nan
+    sigma_r = math.sqrt(right_sq / n_right) if n_right else math.nan
+    gamma = sigma_l / sigma_r if sigma_r else math.nan
+    r_hat = abs_mean ** 2 / (sq_sum / n) if sq_sum else math.nan
+    big_r = r_hat * (gamma ** 3 + 1) * (gamma + 1) / (gamma ** 2 + 1) ** 2
+    rho, alphas = _alpha_table()
+    alpha = float(np.interp(big_r, rho, alphas)) if math.isfinite(big_r) else math.nan
+    # Gamma(2/a) / sqrt(Gamma(1/a) * Gamma(3/a)) is sqrt(rho(alpha)).
+    mean = (sigma_r - sigma_l) * math.sqrt(float(np.interp(alpha, alphas, rho))) if math.isfinite(alpha) else math.nan
+    return alpha, mean, sigma_l, sigma_r
+
+
+def scale_features(gray: np.ndarray) -> List[float]:
+    """The 18 BRISQUE features of one scale."""
+    m = mscn(gray)
+    alpha, _, sigma_l, sigma_r = aggd_fit(m)
+    features = [alpha, (sigma_l ** 2 + sigma_r ** 2) / 2]
+    pairs = (
+        cv2.multiply(m[:, :-1], m[:, 1:]),
+        cv2.multiply(m[:-1, :], m[1:, :]),
+        cv2.multiply(m[:-1, :-1], m[1:, 1:]),
+        cv2.multiply(m[1:, :-1], m[:-1, 1:]),
+    )
+    for pair in pairs:
+        alpha, mean, sigma_l, sigma_r = aggd_fit(pair)
+        features += [alpha, mean, sigma_l ** 2, sigma_r ** 2]
+    return features
+
+
+def brisque_features(img: np.ndarray) -> np.ndarray:
+    """36 BRISQUE features (full and half scale) of a BGR or gray image."""
+    gray = to_gray(img)
+    half = cv2.resize(gray, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_CUBIC)
+    return np.array(scale_features(gray) + scale_features(half), dtype=np.float64)
+
+
+def default_model_dir() -> Optional[str]:
+    """``models`` folder of the installed ``brisque`` package, without importing it."""
+    spec = importlib.util.find_spec("brisque")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    path = os.path.join(list(spec.submodule_search_locations)[0], "models")
+    return path if os.path.exists(os.path.join(path, "svm.txt")) else None
+
+
+class BrisqueModel:
+    """Pre-trained BRISQUE epsilon-SVR with an RBF kernel."""
+
+    def __init__(self, support_vectors: np.ndarray, coefs: np.ndarray, rho: float, gamma: float,
+                 feature_min: np.ndarray, feature_max: np.ndarray):
+        self.support_vectors = support_vectors
+        self.coefs = coefs
+        self.rho = rho
+        self.gamma = gamma
+        self.feature_min = feature_min
+        self.feature_max = feature_max
+        self._sv_sq = np.einsum("ij,ij->i", support_vectors, support_vectors)
+
+    @classmethod
+    def load(cls, model_dir: Optional[str] = None) -> "BrisqueModel":
+        """Read a libsvm model file and its feature ranges."""
+        model_dir = model_dir or default_model_dir()
+        if model_dir is None:
+            raise FileNotFoundError("BRISQUE model not found; install the brisque package or pass model_dir")
+        header = {}
+        coefs = []
+        rows = []
+        with open(os.path.join(model_dir, "svm.txt"), "r", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip() == "SV":
+                    break
+                key, _, value = line.strip().partition(" ")
+                header[key] = value
+            for line in fh:
+                parts = line.split()
+                if not parts:
+                    continue
+                coefs.append(float(parts[0]))
+                row = np.zeros(NUM_FEATURES)
+                for item in parts[1:]:
+                    index, _, value = item.partition(":")
+                    row[int(index) - 1] = float(value)
+                rows.append(row)
+        if header.get("svm_type") != "epsilon_svr" or header.get("kernel_type") != "rbf":
+            raise ValueError(f"Unsupported model: {header.get('svm_type')} / {header.get('kernel_type')}")
+        with open(os.path.join(model_dir, "normalize.pickle"), "rb") as fh:
+            ranges = pickle.load(fh)
+        return cls(
+            np.array(rows),
+            np.array(coefs),
+            float(header["rho"]),
+            float(header["gamma"]),
+            np.asarray(ranges["min_"], dtype=np.float64),
+            np.asarray(ranges["max_"], dtype=np.float64),
+        )
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Scores of an ``(n, 36)`` feature matrix; rows with NaN score NaN."""
+        x = np.atleast_2d(features)
+        x = -1 + 2.0 / (self.feature_max - self.feature_min) * (x - self.feature_min)
+        dist = np.einsum("ij,ij->i", x, x)[:, None] + self._sv_sq[None, :] - 2.0 * x @ self.support_vectors.T
+        return np.exp(-self.gamma * np.maximum(dist, 0.0)) @ self.coefs - self.rho
+
+    def score(self, img: np.ndarray) -> float:
+        return float(self.predict(brisque_features(img))[0])
+
+    def score_batch(self, images: Iterable[np.ndarray]) -> np.ndarray:
+        features = [brisque_features(img) for img in images]
+        if not features:
+            return np.empty(0)
+        return self.predict(np.vstack(features))
+
+
+def reference_score(img: np.ndarray) -> float:
+    """Score of ``img`` (BGR) with the ``brisque`` package, for comparisons.
+
+    Calls the package's feature and SVR code directly because
+    ``BRISQUE.score`` fails on NumPy 2 (features come back as 1-element
+    arrays).
+    """
+    import skimage.color
+    from brisque import BRISQUE
+
+    model = BRISQUE()
+    gray = skimage.color.rgb2gray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    half = cv2.resize(gray, None, fx=1 / 2, fy=1 / 2, interpolation=cv2.INTER_CUBIC)
+    features = [
+        float(np.ravel(f)[0])
+        for scale in (gray, half)
+        for f in model.calculate_brisque_features(scale, kernel_size=KERNEL_SIZE, sigma=KERNEL_SIGMA)
+    ]
+    return float(model.calculate_image_quality_score(features))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute BRISQUE scores with the native OpenCV/NumPy implementation")
+    parser.add_argument("--sample", default=os.path.join("data", "sample_50.txt"), help="File with list of image paths")
+    parser.add_argument("--output", default=os.path.join("reports", "brisque_native_py.csv"))
+    parser.add_argument("--batch-size", type=int, default=64, help="Images per SVR prediction")
+    parser.add_argument("--model-dir", default=None, help="Folder with svm.txt and normalize.pickle")
+    parser.add_argument("--compare", action="store_true", help="Also score with the brisque package and report the difference")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from compute_metrics_py import read_image, read_paths
+
+    model = BrisqueModel.load(args.model_dir)
+    paths = read_paths(args.sample)
+    rows = []
+    native_s = 0.0
+    for i in range(0, len(paths), args.batch_size):
+        batch = []
+        for p in paths[i:i + args.batch_size]:
+            img = read_image(p)
+            if img is None:
+                print(f"Error processing {p}: unable to read image")
+                continue
+            batch.append((p, img))
+        start = time.time()
+        scores = model.score_batch(img for _, img in batch)
+        native_s += time.time() - start
+        rows += [{"path": p, "BrisqueScore": float(s)} for (p, _), s in zip(batch, scores)]
+        if args.compare:
+            for row, (_, img) in zip(rows[-len(batch):], batch):
+                start = time.time()
+                row["ReferenceScore"] = reference_score(img)
+                row["ReferenceMs"] = (time.time() - start) * 1000.0
+
+    df = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    df.to_csv(args.output, index=False)
+    print(f"Scored {len(df)} images in {native_s:.2f}s ({native_s * 1000.0 / max(len(df), 1):.1f} ms/image)")
+    if args.compare and not df.empty:
+        diff = (df["BrisqueScore"] - df["ReferenceScore"]).abs()
+        both_nan = df["BrisqueScore"].isna() & df["ReferenceScore"].isna()
+        print(f"brisque package: {df['ReferenceMs'].mean():.1f} ms/image")
+        print(f"|difference|: max {diff.max():.4f}, median {diff.median():.4f}; "
+              f"{int((diff <= SCORE_TOLERANCE).sum() + both_nan.sum())}/{len(df)} within {SCORE_TOLERANCE}")
+    print(f"Scores written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
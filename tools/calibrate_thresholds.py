@@ -0,0 +1,217 @@
+"""Calibrate quality thresholds against labelled images.
+
+Images are scored once with ``compute_metrics`` and the metric columns are
+cached in a CSV, so later calibrations only score new paths. For every
+threshold setting the scores are sorted once and cumulative positive /
+negative counts give TPR, FPR, precision and F1 at every distinct threshold
+in a single vectorised pass (no re-scoring per candidate).
+
+Labels come from:
+
+* ``--synthetic``: sample list written by ``tools/generate_synthetic_dataset.py``;
+  the degradation is taken from the file name (``blur.png``, ``glare.png`` ...).
+* ``--gopro``: GoPro_Large ``test`` folder; ``blur/`` frames are blurry, the
+  matching ``sharp/`` frames are not (same pairing as ``gopro_test_compare.py``).
+* ``--labels``: any CSV with ``path`` and ``degradation`` columns, such as
+  the ground-truth table of ``generate_synthetic_dataset.py``.
+
+Usage::
+
+    python tools/calibrate_thresholds.py --synthetic data/synthetic_sample.txt \\
+        --gopro data/gopro_large/GoPro_Large/test
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from compute_metrics_py import THRESHOLDS, compute_metrics, read_paths  # noqa: E402
+
+# Threshold setting -> (metric column, side that fails, degradations expected to fail it)
+SETTINGS = {
+    "BlurThreshold": ("BlurScore", "below", {"blur", "motion"}),
+    "AreaThreshold": ("GlareArea", "above", {"glare"}),
+    "ExposureMin": ("Exposure", "below", {"under_exposed"}),
+    "ExposureMax": ("Exposure", "above", {"over_exposed"}),
+    "ContrastMin": ("Contrast", "below", {"low_contrast"}),
+    "NoiseThreshold": ("Noise", "above", {"noise"}),
+    "DominanceThreshold": ("ColorDominance", "above", {"color_dom"}),
+    "BandingThreshold": ("BandingScore", "above", {"banding"}),
+}
+INT_SETTINGS = {"AreaThreshold"}
+
+
+def synthetic_labels(sample_file: str) -> pd.DataFrame:
+    """Labels from synthetic file names (``blur.png`` or ``00000012_blur.png``)."""
+    paths = read_paths(sample_file)
+    degradations = []
+    for p in paths:
+        stem = Path(p.split("#")[-1]).stem
+        prefix, _, rest = stem.partition("_")
+        degradations.append(rest if prefix.isdigit() and rest else stem)
+    return pd.DataFrame({"path": paths, "degradation": degradations})
+
+
+def gopro_labels(test_dir: str) -> pd.DataFrame:
+    root = Path(test_dir)
+    rows = []
+    for blur_path in sorted(list(root.rglob("blur/*.png")) + list(root.rglob("blur/*.jpg"))):
+        sharp_path = blur_path.parent.parent / "sharp" / blur_path.name
+        if sharp_path.exists():
+            rows.append({"path": str(blur_path), "degradation": "blur"})
+            rows.append({"path": str(sharp_path), "degradation": "good"})
+    return pd.DataFrame(rows, columns=["path", "degradation"])
+
+
+def score_cached(paths: List[str], cache: str, brisque: bool = False) -> pd.DataFrame:
+    """Return metrics for ``paths``, scoring only those missing from ``cache``."""
+    cached = pd.read_csv(cache) if os.path.exists(cache) else pd.DataFrame(columns=["path"])
+    missing = sorted(set(paths) - set(cached["path"]))
+    records = []
+    for p in tqdm(missing, desc="Scoring"):
+        try:
+            records.append(compute_metrics(p, brisque=brisque))
+        except Exception as exc:  # pragma: no cover
+            print(f"Error processing {p}: {exc}")
+    if records:
+        new = pd.DataFrame(records)
+        cached = new if cached.empty else pd.concat([cached, new], ignore_index=True)
+        os.makedirs(os.path.dirname(cache) or ".", exist_ok=True)
+        cached.to_csv(cache, index=False)
+    return cached[cached["path"].isin(paths)]
+
+
+def sweep(scores: np.ndarray, positive: np.ndarray, side: str) -> Dict[str, np.ndarray]:
+    """Classification curves for every distinct threshold of ``scores``.
+
+    An item is flagged when its score is ``side`` (``"above"``/``"below"``)
+    the threshold. Returned thresholds sit halfway between consecutive
+    distinct scores, so each one flags exactly the items ranked before it.
+    """
+    keyed = scores if side == "above" else -scores
+    order = np.argsort(-keyed, kind="stable")
+    ranked = keyed[order]
+    pos = positive[order].astype(np.int64)
+    tp = np.cumsum(pos)
+    fp = np.cumsum(1 - pos)
+    # Keep the last index of each run of tied scores.
+    last = np.r_[ranked[1:] != ranked[:-1], True]
+    tp, fp, ranked = tp[last], fp[last], ranked[last]
+    nxt = np.r_[ranked[1:], ranked[-1] - 1.0]
+    cut = (ranked + nxt) / 2.0
+
+    n_pos = max(int(pos.sum()), 1)
+    n_neg = max(int(len(pos) - pos.sum()), 1)
+    tpr = tp / n_pos
+    fpr = fp / n_neg
+    precision = tp / np.maximum(tp + fp, 1)
+    f1 = np.where(precision + tpr > 0, 2 * precision * tpr / np.maximum(precision + tpr, 1e-12), 0.0)
+    return {
+        "Threshold": cut if side == "above" else -cut,
+        "TPR": tpr,
+        "FPR": fpr,
+        "Precision": precision,
+        "F1": f1,
+    }
+
+
+def evaluate(scores: np.ndarray, positive: np.ndarray, side: str, threshold: float) -> float:
+    """F1 of the flag ``score <side> threshold``."""
+    flagged = scores > threshold if side == "above" else scores < threshold
+    tp = np.sum(flagged & positive)
+    fp = np.sum(flagged & ~positive)
+    fn = np.sum(~flagged & positive)
+    return float(2 * tp / max(2 * tp + fp + fn, 1))
+
+
+def calibrate(df: pd.DataFrame, criterion: str = "f1") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Return ``(curves, summary)`` for every setting with labelled positives."""
+    curves = []
+    summary = []
+    for setting, (column, side, degradations) in SETTINGS.items():
+        if column not in df.columns:
+            continue
+        valid = df[column].notna().to_numpy()
+        scores = df[column].to_numpy(dtype=np.float64)[valid]
+        positive = df["degradation"].isin(degradations).to_numpy()[valid]
+        if not positive.any() or positive.all():
+            continue
+        curve = sweep(scores, positive, side)
+        objective = curve["F1"] if criterion == "f1" else curve["TPR"] - curve["FPR"]
+        best = int(np.argmax(objective))
+        recommended = float(curve["Threshold"][best])
+        if setting in INT_SETTINGS:
+            # Integer scores: the integer on the same side of every score as the cut.
+            recommended = float(math.floor(recommended) if side == "above" else math.ceil(recommended))
+        fpr = np.r_[0.0, curve["FPR"]]
+        tpr = np.r_[0.0, curve["TPR"]]
+        auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2.0))
+        curves.append(pd.DataFrame({"Setting": setting, **curve}))
+        summary.append(
+            {
+                "Setting": setting,
+                "Metric": column,
+                "Positives": int(positive.sum()),
+                "Negatives": int((~positive).sum()),
+                "Current": THRESHOLDS[setting],
+                "CurrentF1": evaluate(scores, positive, side, THRESHOLDS[setting]),
+                "Recommended": recommended,
+                "RecommendedF1": evaluate(scores, positive, side, recommended),
+                "AUC": auc,
+            }
+        )
+    curves_df = pd.concat(curves, ignore_index=True) if curves else pd.DataFrame()
+    return curves_df, pd.DataFrame(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate quality thresholds with vectorised ROC/PR sweeps")
+    parser.add_argument("--synthetic", help="Sample list from generate_synthetic_dataset.py")
+    parser.add_argument("--gopro", help="GoPro_Large test folder with blur/sharp pairs")
+    parser.add_argument("--labels", action="append", default=[], help="CSV with path,degradation columns")
+    parser.add_argument("--cache", default=os.path.join("reports", "calibration_scores.csv"))
+    parser.add_argument("--brisque", action="store_true", help="Also compute BRISQUE when scoring")
+    parser.add_argument("--criterion", choices=["f1", "youden"], default="f1")
+    parser.add_argument("--out-dir", default="reports")
+    args = parser.parse_args()
+
+    frames = [pd.read_csv(p)[["path", "degradation"]] for p in args.labels]
+    if args.synthetic:
+        frames.append(synthetic_labels(args.synthetic))
+    if args.gopro:
+        frames.append(gopro_labels(args.gopro))
+    if not frames:
+        parser.error("provide at least one of --synthetic, --gopro or --labels")
+    labels = pd.concat(frames, ignore_index=True).drop_duplicates("path", keep="last")
+
+    scores = score_cached(labels["path"].tolist(), args.cache, brisque=args.brisque)
+    df = labels.merge(scores, on="path", how="inner")
+    curves, summary = calibrate(df, args.criterion)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    curves.to_csv(os.path.join(args.out_dir, "calibration_curves.csv"), index=False)
+    summary.to_csv(os.path.join(args.out_dir, "calibration_summary.csv"), index=False)
+    recommended: Dict[str, Optional[float]] = dict(THRESHOLDS)
+    for row in summary.itertuples():
+        recommended[row.Setting] = int(row.Recommended) if row.Setting in INT_SETTINGS else row.Recommended
+    with open(os.path.join(args.out_dir, "calibrated_thresholds.json"), "w", encoding="utf-8") as fh:
+        json.dump(recommended, fh, indent=2)
+
+    print(f"Calibrated on {len(df)} labelled images")
+    print(summary.to_string(index=False))
+    print(f"Recommended settings written to {os.path.join(args.out_dir, 'calibrated_thresholds.json')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Cold-start regression check for the Python scoring modules.
+
+Runs ``python -X importtime -c "import <module>"`` in fresh interpreters and
+fails when a heavy dependency that should be imported lazily shows up, or
+when the best cumulative import time exceeds the budget.
+
+Measured on the reference container: importing ``python_quality`` took
+~1000 ms when pandas, tqdm and brisque (scipy, scikit-image, libsvm) were
+imported eagerly, and ~100 ms (cv2 + NumPy) once they are deferred. The
+default 250 ms budget leaves headroom for slower machines.
+
+Usage::
+
+    python tools/check_import_time.py
+    python tools/check_import_time.py --module tools.compute_metrics_py --budget-ms 200
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ["pandas", "tqdm", "brisque", "scipy", "skimage", "sklearn", "libsvm", "polars"]
+DEFAULT_BUDGET_MS = 250.0
+
+
+def measure_import(module: str) -> Tuple[float, Dict[str, float]]:
+    """Import ``module`` in a fresh interpreter.
+
+    Returns the cumulative import time of ``module`` in milliseconds and the
+    cumulative time of every top-level package that was imported.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages: Dict[str, float] = {}
+    total = float("nan")
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        ms = int(cumulative) / 1000.0
+        stripped = name.strip()
+        top = stripped.split(".")[0]
+        packages[top] = max(packages.get(top, 0.0), ms)
+        if stripped == module:
+            total = ms
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time and lazy imports with -X importtime")
+    parser.add_argument("--module", default="python_quality")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5, help="Best of N fresh interpreters")
+    args = parser.parse_args()
+
+    best = float("inf")
+    packages: Dict[str, float] = {}
+    for _ in range(args.runs):
+        total, packages = measure_import(args.module)
+        best = min(best, total)
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in packages]
+    if eager:
+        failures.append(f"modules imported eagerly: {', '.join(eager)}")
+    if best > args.budget_ms:
+        failures.append(f"import took {best:.1f} ms, budget {args.budget_ms:.1f} ms")
+
+    heaviest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    print(f"import {args.module}: {best:.1f} ms (best of {args.runs})")
+    for name, ms in heaviest:
+        print(f"  {name:<24} {ms:8.1f} ms")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        raise SystemExit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
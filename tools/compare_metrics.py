@@ -87,9 +87,20 @@ def compare(dotnet_df: pd.DataFrame, py_df: pd.DataFrame) -> pd.DataFrame:
 
 
 def evaluate_against_gt(dotnet_df: pd.DataFrame, py_df: pd.DataFrame, gt_df: pd.DataFrame) -> pd.DataFrame:
+    """Accuracy/MAE of both implementations on the metric columns present in all three frames.
+
+    Raises ``ValueError`` when the ground truth shares no metric column with
+    both results (e.g. a synthetic GT generated without ``--score``).
+    """
+    shared = [c for c in gt_df.columns if c != "path" and c in dotnet_df.columns and c in py_df.columns]
+    if not shared:
+        raise ValueError(
+            "Ground truth has no metric columns in common with the .NET and Python results; "
+            "regenerate it with generate_synthetic_dataset.py --score"
+        )
     records = []
     for col in gt_df.columns:
-        if col == "path":
+        if col == "path" or col not in dotnet_df.columns or col not in py_df.columns:
             continue
         gt_series = gt_df[col]
         if col in BOOL_METRICS:
@@ -152,7 +163,10 @@ def main():
 
     if args.gt:
         gt_df = load_csv(args.gt)
-        gt_metrics = evaluate_against_gt(dotnet_df, py_df, gt_df)
+        try:
+            gt_metrics = evaluate_against_gt(dotnet_df, py_df, gt_df)
+        except ValueError as exc:
+            raise SystemExit(f"Error: {exc}")
         gt_metrics.to_csv(os.path.join("reports", "metrics_against_gt.csv"), index=False)
     else:
         print("No ground-truth provided.")
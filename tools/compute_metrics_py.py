@@ -1,18 +1,21 @@
 import os
+import sys
 import time
 import math
 import argparse
-from typing import List
+import json
+import threading
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
 
 import cv2
 import numpy as np
-import pandas as pd
-from tqdm import tqdm
 
-try:
-    from brisque import BRISQUE
-except Exception:  # pragma: no cover - library may be missing
-    BRISQUE = None
+# pandas and tqdm are imported, and the BRISQUE model loaded, on first use
+# so that importing this module stays cheap.
+_brisque_model = None
+_brisque_loaded = False
+_brisque_lock = threading.Lock()
 
 
 BOOL_METRICS = [
@@ -38,77 +41,422 @@ NUM_METRICS = [
 ]
 
 
-def compute_metrics(image_path: str) -> dict:
+FAIL_FLAGS = [
+    "IsBlurry",
+    "HasGlare",
+    "HasNoise",
+    "HasLowContrast",
+    "HasColorDominance",
+]
+
+
+def read_image(image_path: str) -> Optional[np.ndarray]:
+    """``cv2.imread`` that also accepts ``shard.tar#member`` references (see ``shards.py``)."""
+    if ".tar#" in image_path and not os.path.exists(image_path):
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        if script_dir not in sys.path:
+            sys.path.append(script_dir)
+        from shards import read_ref
+
+        return read_ref(image_path)
+    return cv2.imread(image_path)
+
+
+def compute_metrics(
+    image_path: str,
+    thresholds: Optional[dict] = None,
+    brisque: bool = True,
+    roi: bool = False,
+    record: bool = False,
+) -> Union[dict, "MetricsRecord"]:
     start = time.time()
-    img = cv2.imread(image_path)
+    img = read_image(image_path)
     if img is None:
         raise ValueError(f"Unable to read image: {image_path}")
+    return compute_image_metrics(
+        img, image_path, start=start, thresholds=thresholds, brisque=brisque, roi=roi, record=record
+    )
 
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-    blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
-    is_blurry = blur_score < 100
+# Default thresholds, named after the matching ``QualitySettings`` properties.
+THRESHOLDS = {
+    "BlurThreshold": 100.0,
+    "BrightThreshold": 240,
+    "AreaThreshold": 500,
+    "ExposureMin": 80.0,
+    "ExposureMax": 180.0,
+    "ContrastMin": 30.0,
+    "NoiseThreshold": 20.0,
+    "DominanceThreshold": 1.5,
+    "BandingThreshold": 0.5,
+    "BrisqueMax": 50.0,
+}
+
+RESULT_COLUMNS = [
+    "path",
+    "BlurScore",
+    "IsBlurry",
+    "MotionBlurScore",
+    "GlareArea",
+    "HasGlare",
+    "Exposure",
+    "IsWellExposed",
+    "Contrast",
+    "HasLowContrast",
+    "Noise",
+    "HasNoise",
+    "ColorDominance",
+    "HasColorDominance",
+    "BandingScore",
+    "BrisqueScore",
+    "ElapsedMs",
+]
+
+# Numeric metrics that hold integer counts.
+INT_METRICS = ["GlareArea"]
+# Flag value for "not computed" in ``MetricsBatch`` (same encoding as ``MetricsStore``).
+MISSING_FLAG = 255
+
+
+@dataclass
+class MetricsRecord:
+    """Result of :func:`compute_metrics` as a slotted record.
+
+    Fields follow :data:`RESULT_COLUMNS`; ``RoiFraction`` is NaN unless the
+    metrics were computed with ``roi=True``. Item access (``rec["BlurScore"]``,
+    ``rec.get(...)``) works as on the result dict.
+    """
+
+    __slots__ = tuple(RESULT_COLUMNS) + ("RoiFraction",)
+    path: str
+    BlurScore: float
+    IsBlurry: bool
+    MotionBlurScore: float
+    GlareArea: int
+    HasGlare: bool
+    Exposure: float
+    IsWellExposed: bool
+    Contrast: float
+    HasLowContrast: bool
+    Noise: float
+    HasNoise: bool
+    ColorDominance: float
+    HasColorDominance: bool
+    BandingScore: float
+    BrisqueScore: float
+    ElapsedMs: float
+    RoiFraction: float
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "MetricsRecord":
+        return cls(**{col: values.get(col, math.nan) for col in cls.__slots__})
+
+    def to_dict(self) -> dict:
+        """The result dict of :func:`compute_metrics` (with ``RoiFraction`` only when set)."""
+        res = {col: getattr(self, col) for col in RESULT_COLUMNS}
+        if not math.isnan(self.RoiFraction):
+            res["RoiFraction"] = self.RoiFraction
+        return res
+
+
+class MetricsBatch:
+    """Growable NumPy record array of per-image results.
+
+    Numeric columns are float64 and flags uint8 (``MISSING_FLAG`` when not
+    computed), about 100 bytes per row plus the path, against well over a
+    kilobyte for a result dict. Rows are appended from :class:`MetricsRecord`
+    objects or result dicts; missing numeric values are NaN.
+
+    Parameters
+    ----------
+    capacity: int
+        Initial number of rows; the array doubles when full.
+    num_columns, bool_columns: sequence of str
+        Schema, :data:`NUM_METRICS` and :data:`BOOL_METRICS` by default.
+    extra_columns: sequence of str
+        Additional float64 columns (e.g. ``RoiFraction``), dropped from
+        :meth:`to_frame` when entirely NaN.
+    """
+
+    def __init__(self, capacity: int = 1024, num_columns: Sequence[str] = NUM_METRICS,
+                 bool_columns: Sequence[str] = BOOL_METRICS, extra_columns: Sequence[str] = ("RoiFraction",)):
+        self.num_columns = list(num_columns) + list(extra_columns)
+        self.bool_columns = list(bool_columns)
+        self.extra_columns = list(extra_columns)
+        self.dtype = np.dtype([(c, np.float64) for c in self.num_columns] + [(c, np.uint8) for c in self.bool_columns])
+        self._data = np.empty(max(capacity, 1), dtype=self.dtype)
+        self._len = 0
+        self.paths: List[str] = []
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def data(self) -> np.ndarray:
+        """Structured array view of the appended rows."""
+        return self._data[:self._len]
 
+    def append(self, res: Union[MetricsRecord, dict]) -> None:
+        if self._len == len(self._data):
+            grown = np.empty(2 * len(self._data), dtype=self.dtype)
+            grown[:self._len] = self._data[:self._len]
+            self._data = grown
+        get = res.get
+        row = [get(c) for c in self.num_columns] + [get(c) for c in self.bool_columns]
+        row = tuple(
+            [math.nan if v is None else v for v in row[:len(self.num_columns)]]
+            + [MISSING_FLAG if v is None else bool(v) for v in row[len(self.num_columns):]]
+        )
+        self._data[self._len] = row
+        self._len += 1
+        self.paths.append(get("path") or "")
+
+    def extend(self, results: Iterable[Union[MetricsRecord, dict]]) -> None:
+        for res in results:
+            self.append(res)
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of ``name``; flags as booleans (missing counts as ``False``)."""
+        values = self.data[name]
+        return values == 1 if name in self.bool_columns else values
+
+    def to_frame(self):
+        """DataFrame with the same columns and dtypes as a frame of result dicts."""
+        import pandas as pd
+
+        data = self.data
+        schema = self.num_columns + self.bool_columns
+        ordered = [c for c in RESULT_COLUMNS if c in schema] + [c for c in schema if c not in RESULT_COLUMNS]
+        columns = {"path": list(self.paths)}
+        for name in ordered:
+            values = data[name]
+            if name in self.bool_columns:
+                columns[name] = pd.Series(values == 1).where(values != MISSING_FLAG)
+            elif name in self.extra_columns and np.isnan(values).all():
+                continue
+            elif name in INT_METRICS:
+                columns[name] = pd.Series(values).round().astype("Int64")
+            else:
+                columns[name] = values.copy()
+        return pd.DataFrame(columns)
+
+    def to_csv(self, output: str) -> None:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        self.to_frame().to_csv(output, index=False)
+
+
+def histogram_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
+    """Exposure (mean) and contrast (std) of ``gray`` from its 256-bin histogram."""
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel().astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    count = hist.sum()
+    exposure = float(hist @ levels / count)
+    contrast = float(math.sqrt(max(hist @ (levels * levels) / count - exposure * exposure, 0.0)))
+    return {
+        "Exposure": exposure,
+        "IsWellExposed": bool(t["ExposureMin"] <= exposure <= t["ExposureMax"]),
+        "Contrast": contrast,
+        "HasLowContrast": bool(contrast < t["ContrastMin"]),
+    }
+
+
+def blur_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_64F))
+    blur_score = float(std[0, 0] ** 2)
+    return {"BlurScore": blur_score, "IsBlurry": bool(blur_score < t["BlurThreshold"])}
+
+
+def motion_blur_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
     grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
     grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-    grad_h = np.mean(np.abs(grad_x))
-    grad_v = np.mean(np.abs(grad_y))
-    motion_blur_score = max(grad_h, 1.0) / max(grad_v, 1.0)
+    grad_h = cv2.norm(grad_x, cv2.NORM_L1) / grad_x.size
+    grad_v = cv2.norm(grad_y, cv2.NORM_L1) / grad_y.size
+    return {"MotionBlurScore": float(max(grad_h, 1.0) / max(grad_v, 1.0))}
 
-    glare_area = int(np.sum(img > 240))
-    has_glare = glare_area > 500
 
-    exposure = float(np.mean(gray))
-    is_well_exposed = 80 <= exposure <= 180
+def glare_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
+    _, bright = cv2.threshold(img, t["BrightThreshold"], 255, cv2.THRESH_BINARY)
+    glare_area = int(cv2.countNonZero(bright.reshape(bright.shape[0], -1)))
+    return {"GlareArea": glare_area, "HasGlare": bool(glare_area > t["AreaThreshold"])}
 
-    contrast = float(np.std(gray))
-    has_low_contrast = contrast < 30
 
+def noise_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
     blurred = cv2.GaussianBlur(gray, (3, 3), 0)
-    noise = float(np.mean(cv2.absdiff(gray, blurred)))
-    has_noise = noise > 20
+    noise = float(cv2.mean(cv2.absdiff(gray, blurred))[0])
+    return {"Noise": noise, "HasNoise": bool(noise > t["NoiseThreshold"])}
+
 
-    mean_b = np.mean(img[:, :, 0])
-    mean_g = np.mean(img[:, :, 1])
-    mean_r = np.mean(img[:, :, 2])
+def color_dominance_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
+    mean_b, mean_g, mean_r, _ = cv2.mean(img)
     mean_rgb = (mean_r + mean_g + mean_b) / 3.0
     color_dominance = float(max(mean_r, mean_g, mean_b) / (mean_rgb + 1e-6))
-    has_color_dominance = color_dominance > 1.5
+    return {
+        "ColorDominance": color_dominance,
+        "HasColorDominance": bool(color_dominance > t["DominanceThreshold"]),
+    }
 
-    mean_rows = np.mean(gray, axis=1)
-    mean_cols = np.mean(gray, axis=0)
-    banding_score = float(np.var(mean_rows) + np.var(mean_cols))
 
-    if BRISQUE is not None:
-        try:
-            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            brisque_score = float(BRISQUE().score(rgb))
-        except Exception:
-            brisque_score = math.nan
-    else:
-        brisque_score = math.nan
+def banding_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
+    mean_rows = cv2.reduce(gray, 1, cv2.REDUCE_AVG, dtype=cv2.CV_64F)
+    mean_cols = cv2.reduce(gray, 0, cv2.REDUCE_AVG, dtype=cv2.CV_64F)
+    _, std_rows = cv2.meanStdDev(mean_rows)
+    _, std_cols = cv2.meanStdDev(mean_cols)
+    return {"BandingScore": float(std_rows[0, 0] ** 2 + std_cols[0, 0] ** 2)}
 
-    elapsed_ms = (time.time() - start) * 1000.0
 
-    return {
-        "path": image_path,
-        "BlurScore": float(blur_score),
-        "IsBlurry": bool(is_blurry),
-        "MotionBlurScore": float(motion_blur_score),
-        "GlareArea": int(glare_area),
-        "HasGlare": bool(has_glare),
-        "Exposure": float(exposure),
-        "IsWellExposed": bool(is_well_exposed),
-        "Contrast": float(contrast),
-        "HasLowContrast": bool(has_low_contrast),
-        "Noise": float(noise),
-        "HasNoise": bool(has_noise),
-        "ColorDominance": float(color_dominance),
-        "HasColorDominance": bool(has_color_dominance),
-        "BandingScore": float(banding_score),
-        "BrisqueScore": brisque_score,
-        "ElapsedMs": float(elapsed_ms),
-    }
+def load_brisque():
+    """Return a shared BRISQUE model (``brisque_native.BrisqueModel``).
+
+    The pre-trained model is read from the ``brisque`` package on first call;
+    returns ``None`` when it is not installed.
+    """
+    global _brisque_model, _brisque_loaded
+    with _brisque_lock:
+        if not _brisque_loaded:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            if script_dir not in sys.path:
+                sys.path.append(script_dir)
+            try:
+                from brisque_native import BrisqueModel
+
+                _brisque_model = BrisqueModel.load()
+            except Exception:  # pragma: no cover - model may be missing
+                _brisque_model = None
+            _brisque_loaded = True
+    return _brisque_model
+
+
+def brisque_metrics(img: np.ndarray, gray: np.ndarray, t: dict) -> dict:
+    model = load_brisque()
+    if model is None:
+        return {"BrisqueScore": math.nan}
+    try:
+        return {"BrisqueScore": model.score(img)}
+    except Exception:
+        return {"BrisqueScore": math.nan}
+
+
+# Document localisation runs on a copy whose longer side is at most this.
+ROI_MAX_SIDE = 512
+# Smallest document quad, as a fraction of the frame area.
+ROI_MIN_AREA = 0.05
+# Quads covering more than this fraction of the frame are not cropped.
+ROI_MAX_AREA = 0.95
+# Margin added around the detected quad, as a fraction of its size.
+ROI_MARGIN = 0.02
+
+
+def document_roi(gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box ``(x, y, w, h)`` of the document page in ``gray``.
+
+    The largest convex four-sided contour of the Canny edges of a downscaled
+    copy is taken as the page. Returns ``None`` when no such quad is found or
+    when it already covers almost the whole frame; callers then score the
+    full frame, paying the detection on top of the full-frame metrics.
+    """
+    h, w = gray.shape[:2]
+    scale = min(1.0, ROI_MAX_SIDE / max(h, w))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = ROI_MIN_AREA * small.shape[0] * small.shape[1]
+    quad = None
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            quad = approx
+            break
+    if quad is None:
+        return None
+    x, y, bw, bh = cv2.boundingRect(quad)
+    mx, my = bw * ROI_MARGIN, bh * ROI_MARGIN
+    x0 = max(int((x - mx) / scale), 0)
+    y0 = max(int((y - my) / scale), 0)
+    x1 = min(int(math.ceil((x + bw + mx) / scale)), w)
+    y1 = min(int(math.ceil((y + bh + my) / scale)), h)
+    if (x1 - x0) * (y1 - y0) > ROI_MAX_AREA * w * h:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+# Individual checks in the order used by a full evaluation.
+METRIC_CHECKS = {
+    "histogram": histogram_metrics,
+    "blur": blur_metrics,
+    "motion_blur": motion_blur_metrics,
+    "glare": glare_metrics,
+    "noise": noise_metrics,
+    "color_dominance": color_dominance_metrics,
+    "banding": banding_metrics,
+    "brisque": brisque_metrics,
+}
+
+
+def compute_image_metrics(
+    img: np.ndarray,
+    image_path: str = "",
+    start: Optional[float] = None,
+    thresholds: Optional[dict] = None,
+    brisque: bool = True,
+    roi: bool = False,
+    record: bool = False,
+) -> Union[dict, MetricsRecord]:
+    """Compute metrics for an already decoded BGR image.
+
+    ``start`` lets callers that decoded ``img`` themselves include the decode
+    time in ``ElapsedMs``; by default only the metric computation is timed.
+    ``thresholds`` overrides entries of :data:`THRESHOLDS`. With
+    ``brisque=False`` the BRISQUE model is never loaded and
+    ``BrisqueScore`` is NaN. With ``roi=True`` every metric is computed on
+    the :func:`document_roi` crop, and ``RoiFraction`` (cropped pixels over
+    frame pixels, 1.0 when no document was found) is added to the result.
+    With ``record=True`` a :class:`MetricsRecord` is returned instead of a
+    dict, ready to be appended to a :class:`MetricsBatch`.
+    """
+    if start is None:
+        start = time.time()
+    t = {**THRESHOLDS, **(thresholds or {})}
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    values = {"path": image_path, "BrisqueScore": math.nan}
+    columns = RESULT_COLUMNS
+    if roi:
+        box = document_roi(gray)
+        values["RoiFraction"] = 1.0
+        if box is not None:
+            x, y, w, h = box
+            values["RoiFraction"] = w * h / float(gray.shape[0] * gray.shape[1])
+            img = img[y:y + h, x:x + w]
+            gray = gray[y:y + h, x:x + w]
+        columns = RESULT_COLUMNS + ["RoiFraction"]
+    for name, check in METRIC_CHECKS.items():
+        if name == "brisque" and not brisque:
+            continue
+        values.update(check(img, gray, t))
+    values["ElapsedMs"] = (time.time() - start) * 1000.0
+    if record:
+        return MetricsRecord(**{col: values[col] for col in RESULT_COLUMNS},
+                             RoiFraction=values.get("RoiFraction", math.nan))
+    return {col: values[col] for col in columns}
+
+
+def failed_checks(metrics: dict) -> List[str]:
+    """Return the names of the quality flags that ``metrics`` fails."""
+    failed = [flag for flag in FAIL_FLAGS if metrics.get(flag)]
+    if not metrics.get("IsWellExposed", True):
+        failed.append("IsWellExposed")
+    return failed
 
 
 def read_paths(file_path: str) -> List[str]:
@@ -128,21 +476,53 @@ def main():
         default=os.path.join("reports", "metrics_per_image_py.csv"),
         help="Output CSV path",
     )
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="Also append the results as a new run to this metrics store directory",
+    )
+    parser.add_argument("--no-brisque", action="store_true", help="Skip BRISQUE (BrisqueScore set to NaN)")
+    parser.add_argument(
+        "--roi",
+        action="store_true",
+        help="Compute the metrics on the detected document region only",
+    )
+    parser.add_argument(
+        "--thresholds",
+        default=None,
+        help="JSON file overriding THRESHOLDS (e.g. calibrated_thresholds.json)",
+    )
     args = parser.parse_args()
 
+    thresholds = None
+    if args.thresholds:
+        with open(args.thresholds, "r", encoding="utf-8") as fh:
+            thresholds = json.load(fh)
+
+    from tqdm import tqdm
+
     paths = read_paths(args.sample)
-    results = []
+    results = MetricsBatch(len(paths))
     for p in tqdm(paths, desc="Processing"):
         try:
-            results.append(compute_metrics(p))
+            results.append(
+                compute_metrics(p, thresholds=thresholds, brisque=not args.no_brisque, roi=args.roi, record=True)
+            )
         except Exception as exc:  # pragma: no cover
             print(f"Error processing {p}: {exc}")
 
-    df = pd.DataFrame(results)
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    df = results.to_frame()
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
     df.to_csv(args.output, index=False)
+    if args.store:
+        from metrics_store import MetricsStore
+
+        MetricsStore(args.store).append(df, source=args.sample)
+
+    if args.roi and not df.empty:
+        print(f"Document ROI: {df['RoiFraction'].mean():.1%} of the frame pixels on average")
 
-    if BRISQUE is None:
+    if not args.no_brisque and load_brisque() is None:
         print("Warning: BRISQUE not available, values set to NaN")
 
 
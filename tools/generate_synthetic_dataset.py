@@ -1,69 +1,212 @@
-import os
+"""Generate synthetic degraded images with a ground-truth table.
+
+Every item is derived only from ``(seed, index)``: the degradation (round
+robin over all kinds, or drawn from ``--mix`` weights), its severity and any
+random noise use ``numpy.random.default_rng([seed, index])``, so output is
+identical whatever the number of workers. Items are produced by a process
+pool and written in order as they arrive, either as loose files or as tar
+shards, while the ground-truth CSV and sample list are streamed to disk.
+
+With the defaults (10 images, 256x256, severity 0.5) the output matches the
+original fixed set: one image per degradation.
+
+Usage::
+
+    python tools/generate_synthetic_dataset.py
+    python tools/generate_synthetic_dataset.py --count 1000000 --size 2480x3508 \\
+        --mix blur=2,glare=1,good=4 --severity 0.2,0.9 --workers 16 --format tar
+"""
 import argparse
-import numpy as np
-import cv2
-import pandas as pd
+import csv
+import multiprocessing as mp
+import os
 import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
 
 # Allow importing compute_metrics from same directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 if SCRIPT_DIR not in sys.path:
     sys.path.append(SCRIPT_DIR)
-from compute_metrics_py import compute_metrics  # noqa: E402
+from compute_metrics_py import RESULT_COLUMNS, compute_image_metrics  # noqa: E402
+from shards import ShardWriter  # noqa: E402
+
+# Items per sub-directory when writing loose files for large datasets.
+FILES_PER_DIR = 10000
 
 
-def make_base(size=256):
-    """Return a neutral gray image"""
-    return np.full((size, size, 3), 128, dtype=np.uint8)
+def _odd(value: float) -> int:
+    return max(1, int(round(value)) // 2 * 2 + 1)
 
 
-def add_glare(img):
-    cv2.rectangle(img, (int(img.shape[1]*0.6), int(img.shape[0]*0.1)),
-                  (int(img.shape[1]*0.9), int(img.shape[0]*0.4)), (255, 255, 255), -1)
+def make_base(size=256, width: Optional[int] = None, style: str = "gray", rng=None):
+    """Return the clean base image: neutral gray or a document-like page."""
+    height = size
+    width = width or size
+    img = np.full((height, width, 3), 128, dtype=np.uint8)
+    if style == "document":
+        rng = rng or np.random.default_rng(0)
+        img[:] = 235
+        line_h = max(4, height // 40)
+        margin = width // 10
+        for y in range(margin, height - margin, 2 * line_h):
+            x = margin
+            while x < width - margin:
+                word = int(rng.integers(line_h, 6 * line_h))
+                cv2.rectangle(img, (x, y), (min(x + word, width - margin), y + line_h // 2), (30, 30, 30), -1)
+                x += word + line_h
     return img
 
 
-def add_noise(img, amt=25):
-    noise = np.random.normal(0, amt, img.shape).astype(np.int16)
+def add_glare(img, severity=0.5):
+    h, w = img.shape[:2]
+    extent = 0.6 * severity
+    cv2.rectangle(img, (int(w * 0.6), int(h * 0.1)),
+                  (int(w * min(0.6 + extent, 1.0)), int(h * min(0.1 + extent, 1.0))), (255, 255, 255), -1)
+    return img
+
+
+def add_noise(img, amt=25, rng=None):
+    rng = rng or np.random.default_rng()
+    noise = rng.normal(0, amt, img.shape).astype(np.int16)
     noisy = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
     return noisy
 
 
-def low_contrast(img):
-    return cv2.convertScaleAbs(img, alpha=0.3, beta=128*(1-0.3))
+def low_contrast(img, alpha=0.3):
+    return cv2.convertScaleAbs(img, alpha=alpha, beta=128*(1-alpha))
 
 
-def over_exposed(img):
-    return cv2.convertScaleAbs(img, alpha=1.0, beta=100)
+def over_exposed(img, beta=100):
+    return cv2.convertScaleAbs(img, alpha=1.0, beta=beta)
 
 
-def under_exposed(img):
-    return cv2.convertScaleAbs(img, alpha=1.0, beta=-80)
+def under_exposed(img, beta=-80):
+    return cv2.convertScaleAbs(img, alpha=1.0, beta=beta)
 
 
-def color_dominant(img):
+def color_dominant(img, level=255):
     img = img.copy()
-    img[:, :, 2] = 255  # strong red channel
+    img[:, :, 2] = level  # strong red channel
     return img
 
 
-def banding(img):
-    img = img.copy()
+def banding(img, amp=40):
+    img = img.copy().astype(np.int16)
     for i in range(0, img.shape[0], 20):
-        img[i:i+10] = img[i:i+10] + 40
+        img[i:i+10] = img[i:i+10] + amp
     return np.clip(img, 0, 255).astype(np.uint8)
 
 
-def motion_blur(img):
-    ksize = 15
+def motion_blur(img, ksize=15):
     kernel = np.zeros((ksize, ksize))
     kernel[int((ksize - 1)/2), :] = np.ones(ksize)
     kernel = kernel / ksize
     return cv2.filter2D(img, -1, kernel)
 
 
-def blur(img):
-    return cv2.GaussianBlur(img, (15, 15), 0)
+def blur(img, ksize=15):
+    return cv2.GaussianBlur(img, (ksize, ksize), 0)
+
+
+# Degradation name -> function of (image, severity in [0, 1], rng). Severity
+# 0.5 reproduces the parameters of the original fixed dataset.
+DEGRADATIONS = {
+    "good": lambda img, s, rng: img,
+    "blur": lambda img, s, rng: blur(img, _odd(3 + 24 * s)),
+    "motion": lambda img, s, rng: motion_blur(img, _odd(3 + 24 * s)),
+    "glare": lambda img, s, rng: add_glare(img.copy(), s),
+    "noise": lambda img, s, rng: add_noise(img, 50 * s, rng),
+    "low_contrast": lambda img, s, rng: low_contrast(img, max(1.0 - 1.4 * s, 0.0)),
+    "over_exposed": lambda img, s, rng: over_exposed(img, 200 * s),
+    "under_exposed": lambda img, s, rng: under_exposed(img, -160 * s),
+    "color_dom": lambda img, s, rng: color_dominant(img, min(int(128 + 254 * s), 255)),
+    "banding": lambda img, s, rng: banding(img, int(80 * s)),
+}
+
+GT_COLUMNS = ["index", "path", "degradation", "severity", "seed", "width", "height"]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEGRADATIONS:
+            raise ValueError(f"Unknown degradation: {name}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def item_spec(index: int, seed: int, mix: Optional[Dict[str, float]],
+              severity: Tuple[float, float]) -> Tuple[str, float, np.random.Generator]:
+    """Return the degradation, severity and RNG of item ``index``."""
+    rng = np.random.default_rng([seed, index])
+    if mix is None:
+        names = list(DEGRADATIONS)
+        kind = names[index % len(names)]
+    else:
+        names = list(mix)
+        weights = np.array([mix[n] for n in names], dtype=np.float64)
+        kind = names[int(rng.choice(len(names), p=weights / weights.sum()))]
+    level = float(rng.uniform(*severity)) if severity[0] != severity[1] else severity[0]
+    return kind, level, rng
+
+
+_CONFIG: dict = {}
+
+
+def _init_worker(config: dict) -> None:
+    _CONFIG.update(config)
+    cv2.setNumThreads(1)
+
+
+def _generate_item(index: int) -> Tuple[dict, Optional[bytes], Optional[dict]]:
+    cfg = _CONFIG
+    kind, level, rng = item_spec(index, cfg["seed"], cfg["mix"], cfg["severity"])
+    width, height = cfg["size"]
+    base = make_base(height, width, cfg["base"], rng)
+    img = DEGRADATIONS[kind](base, level, rng)
+
+    name = f"{index:08d}_{kind}{cfg['ext']}" if cfg["indexed"] else f"{kind}{cfg['ext']}"
+    params = [cv2.IMWRITE_JPEG_QUALITY, cfg["jpeg_quality"]] if cfg["ext"] == ".jpg" else []
+    ok, buf = cv2.imencode(cfg["ext"], img, params)
+    if not ok:
+        raise ValueError(f"Unable to encode item {index}")
+    if cfg["format"] == "files":
+        folder = cfg["out_dir"]
+        if cfg["count"] > FILES_PER_DIR:
+            folder = os.path.join(folder, f"{index // FILES_PER_DIR:05d}")
+            os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, name)
+        buf.tofile(path)
+        data = None
+    else:
+        path = name
+        data = buf.tobytes()
+
+    row = {
+        "index": index,
+        "path": path,
+        "degradation": kind,
+        "severity": level,
+        "seed": cfg["seed"],
+        "width": width,
+        "height": height,
+    }
+    metrics = None
+    if cfg["score"]:
+        # Score what was written: lossy encoding changes blur and noise.
+        metrics = compute_image_metrics(cv2.imdecode(buf, cv2.IMREAD_COLOR), path, brisque=False)
+    return row, data, metrics
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height or width)
 
 
 def main():
@@ -71,41 +214,80 @@ def main():
     parser.add_argument('--out-dir', default=os.path.join('data', 'synthetic'))
     parser.add_argument('--sample', default=os.path.join('data', 'synthetic_sample.txt'))
     parser.add_argument('--gt', default=os.path.join('data', 'synthetic_gt.csv'))
+    parser.add_argument('--count', type=int, default=len(DEGRADATIONS), help='Number of images')
+    parser.add_argument('--size', default='256x256', help='Image size WIDTHxHEIGHT')
+    parser.add_argument('--mix', default=None,
+                        help='Degradation weights, e.g. "good=4,blur=1,glare=1" (default: round robin)')
+    parser.add_argument('--severity', default='0.5,0.5', help='Severity range "min,max" in [0, 1]')
+    parser.add_argument('--base', choices=['gray', 'document'], default='gray', help='Clean base image')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--format', choices=['files', 'tar'], default='files')
+    parser.add_argument('--shard-size', type=int, default=1000, help='Images per tar shard')
+    parser.add_argument('--ext', choices=['png', 'jpg'], default='png')
+    parser.add_argument('--jpeg-quality', type=int, default=90)
+    parser.add_argument('--score', action='store_true',
+                        help='Add compute_metrics columns (without BRISQUE) to the ground truth')
     args = parser.parse_args()
 
+    lo, _, hi = args.severity.partition(',')
     os.makedirs(args.out_dir, exist_ok=True)
-    images = []
-    # Create set of images with different issues
-    base = make_base()
-    images.append(('good', base))
-    images.append(('blur', blur(base)))
-    images.append(('motion', motion_blur(base)))
-    images.append(('glare', add_glare(base.copy())))
-    images.append(('noise', add_noise(base)))
-    images.append(('low_contrast', low_contrast(base)))
-    images.append(('over_exposed', over_exposed(base)))
-    images.append(('under_exposed', under_exposed(base)))
-    images.append(('color_dom', color_dominant(base)))
-    images.append(('banding', banding(base)))
-
-    paths = []
-    records = []
-    for name, img in images:
-        path = os.path.join(args.out_dir, f'{name}.png')
-        cv2.imwrite(path, img)
-        paths.append(path)
-        records.append(compute_metrics(path))
-
-    # write sample list
-    with open(args.sample, 'w', encoding='utf-8') as f:
-        for p in paths:
-            f.write(p + '\n')
-
-    # ground truth metrics
-    pd.DataFrame(records).to_csv(args.gt, index=False)
-    print(f'Generated {len(paths)} images in {args.out_dir}')
+    config = {
+        "out_dir": args.out_dir,
+        "count": args.count,
+        "size": parse_size(args.size),
+        "mix": parse_mix(args.mix) if args.mix else None,
+        "severity": (float(lo), float(hi or lo)),
+        "base": args.base,
+        "seed": args.seed,
+        "format": args.format,
+        "ext": f".{args.ext}",
+        "jpeg_quality": args.jpeg_quality,
+        "score": args.score,
+        # Keep the original "<degradation>.png" names for the default set.
+        "indexed": args.count != len(DEGRADATIONS) or args.mix is not None,
+    }
+
+    for path in (args.sample, args.gt):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    columns = GT_COLUMNS + ([c for c in RESULT_COLUMNS if c != "path"] if args.score else [])
+    shards = ShardWriter(args.out_dir, args.shard_size) if args.format == "tar" else None
+    start = time.time()
+    written = 0
+    with open(args.sample, 'w', encoding='utf-8') as sample_fh, \
+            open(args.gt, 'w', newline='', encoding='utf-8') as gt_fh:
+        writer = csv.DictWriter(gt_fh, fieldnames=columns)
+        writer.writeheader()
+        if args.workers > 1:
+            pool = mp.Pool(args.workers, initializer=_init_worker, initargs=(config,))
+            chunksize = max(1, min(64, args.count // (args.workers * 4) or 1))
+            results = pool.imap(_generate_item, range(args.count), chunksize=chunksize)
+        else:
+            pool = None
+            _init_worker(config)
+            results = map(_generate_item, range(args.count))
+        try:
+            for row, data, metrics in results:
+                if shards is not None:
+                    row["path"] = shards.add(row["path"], data)
+                if metrics is not None:
+                    row.update({k: v for k, v in metrics.items() if k != "path"})
+                writer.writerow(row)
+                sample_fh.write(row["path"] + '\n')
+                written += 1
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            if shards is not None:
+                shards.close()
+    elapsed = time.time() - start
+
+    print(f'Generated {written} images in {args.out_dir} ({written / elapsed if elapsed > 0 else 0:.1f} images/s)')
+    if shards is not None:
+        print(f'Wrote {len(shards.shards)} tar shards')
     print(f'Sample list written to {args.sample}')
-    print(f'Ground truth metrics written to {args.gt}')
+    print(f'Ground truth written to {args.gt}')
 
 
 if __name__ == '__main__':
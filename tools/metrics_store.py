@@ -0,0 +1,264 @@
+"""Memory-mapped columnar store for ``compute_metrics`` history.
+
+Every metric is kept in its own flat file under the store directory:
+``<Metric>.f32`` (float32) for ``NUM_METRICS`` and ``<Flag>.u8`` for
+``BOOL_METRICS`` (0/1, 255 when the value is missing). Paths are stored once
+in the ``paths.txt`` dictionary and referenced by ``path_id.u32``; each row
+belongs to a run recorded in ``runs.jsonl`` (id, timestamp, source, rows),
+referenced by ``run_id.u32``. Runs are appended column by column and become
+visible only once their ``runs.jsonl`` line is written, so an interrupted
+append is ignored on the next open.
+
+Usage::
+
+    python tools/metrics_store.py ingest reports/metrics_per_image_py.csv --date 2025-07-01
+    python tools/metrics_store.py fail-rate --flag IsBlurry --by day
+    python tools/metrics_store.py export --run 3 --output reports/metrics_per_image_py.csv
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import sys
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from compute_metrics_py import BOOL_METRICS, INT_METRICS, NUM_METRICS, RESULT_COLUMNS  # noqa: E402
+
+DEFAULT_STORE = os.path.join("reports", "metrics_store")
+MISSING_BOOL = 255
+# Flags where ``True`` is the desirable outcome.
+PASS_FLAGS = {"IsWellExposed"}
+_INT_METRICS = set(INT_METRICS)
+
+
+class MetricsStore:
+    """Append-only columnar store of per-image metrics."""
+
+    def __init__(self, root: str = DEFAULT_STORE):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.runs: List[dict] = []
+        runs_path = self._file("runs.jsonl")
+        if os.path.exists(runs_path):
+            with open(runs_path, "r", encoding="utf-8") as fh:
+                self.runs = [json.loads(line) for line in fh if line.strip()]
+        self.rows = sum(run["rows"] for run in self.runs)
+        self.paths: List[str] = []
+        paths_file = self._file("paths.txt")
+        if os.path.exists(paths_file):
+            with open(paths_file, "r", encoding="utf-8") as fh:
+                self.paths = [line.rstrip("\n") for line in fh]
+        self._path_ids = {p: i for i, p in enumerate(self.paths)}
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    @staticmethod
+    def _column_file(name: str) -> str:
+        if name in NUM_METRICS:
+            return f"{name}.f32"
+        if name in BOOL_METRICS:
+            return f"{name}.u8"
+        if name in ("path_id", "run_id"):
+            return f"{name}.u32"
+        raise KeyError(f"Unknown column: {name}")
+
+    def column(self, name: str) -> np.ndarray:
+        """Return a read-only memory-mapped view of ``name`` over all committed rows."""
+        file_name = self._column_file(name)
+        dtype = {"f32": np.float32, "u8": np.uint8, "u32": np.uint32}[file_name.rsplit(".", 1)[1]]
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(file_name), dtype=dtype, mode="r", shape=(self.rows,))
+
+    def append(self, records: Union[pd.DataFrame, Iterable[dict]], timestamp: Optional[dt.datetime] = None,
+               source: str = "") -> int:
+        """Append one run of ``compute_metrics`` results and return its run id."""
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+        rows = len(df)
+        run_id = len(self.runs)
+        timestamp = timestamp or dt.datetime.now()
+
+        # Drop bytes left behind by an interrupted append before writing.
+        for name in NUM_METRICS + BOOL_METRICS + ["path_id", "run_id"]:
+            path = self._file(self._column_file(name))
+            if os.path.exists(path):
+                itemsize = 4 if not path.endswith(".u8") else 1
+                if os.path.getsize(path) != self.rows * itemsize:
+                    with open(path, "r+b") as fh:
+                        fh.truncate(self.rows * itemsize)
+
+        new_paths = []
+        path_ids = np.empty(rows, dtype=np.uint32)
+        for i, p in enumerate(df["path"].astype(str) if "path" in df.columns else [""] * rows):
+            pid = self._path_ids.get(p)
+            if pid is None:
+                pid = self._path_ids[p] = len(self.paths)
+                self.paths.append(p)
+                new_paths.append(p)
+            path_ids[i] = pid
+        with open(self._file("paths.txt"), "a", encoding="utf-8") as fh:
+            fh.writelines(p + "\n" for p in new_paths)
+
+        columns = {
+            "path_id": path_ids,
+            "run_id": np.full(rows, run_id, dtype=np.uint32),
+        }
+        for name in NUM_METRICS:
+            if name in df.columns:
+                columns[name] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float32)
+            else:
+                columns[name] = np.full(rows, np.nan, dtype=np.float32)
+        for name in BOOL_METRICS:
+            if name in df.columns:
+                values = df[name]
+                missing = values.isna().to_numpy()
+                flags = values.fillna(False).astype(bool).to_numpy()
+                columns[name] = np.where(missing, MISSING_BOOL, flags).astype(np.uint8)
+            else:
+                columns[name] = np.full(rows, MISSING_BOOL, dtype=np.uint8)
+        for name, values in columns.items():
+            with open(self._file(self._column_file(name)), "ab") as fh:
+                fh.write(values.tobytes())
+
+        run = {"id": run_id, "timestamp": timestamp.isoformat(), "source": source, "rows": rows}
+        with open(self._file("runs.jsonl"), "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(run) + "\n")
+        self.runs.append(run)
+        self.rows += rows
+        return run_id
+
+    def ingest_csv(self, csv_path: str, timestamp: Optional[dt.datetime] = None) -> int:
+        """Append an existing ``metrics_per_image_*.csv`` file as one run."""
+        if timestamp is None:
+            timestamp = dt.datetime.fromtimestamp(os.path.getmtime(csv_path))
+        return self.append(pd.read_csv(csv_path), timestamp=timestamp, source=csv_path)
+
+    def _row_periods(self, by: str) -> np.ndarray:
+        if by == "run":
+            keys = np.array([run["id"] for run in self.runs], dtype=np.int64)
+        elif by in ("day", "month"):
+            unit = "D" if by == "day" else "M"
+            keys = np.array([run["timestamp"] for run in self.runs], dtype=f"datetime64[{unit}]")
+        else:
+            raise ValueError(f"Unknown grouping: {by}")
+        return keys[self.column("run_id")]
+
+    def fail_rate(self, flag: str, by: str = "day") -> pd.DataFrame:
+        """Fraction of images failing ``flag`` per ``day``, ``month`` or ``run``."""
+        if flag not in BOOL_METRICS:
+            raise KeyError(f"Unknown flag: {flag}")
+        values = self.column(flag)
+        valid = values != MISSING_BOOL
+        failed = values == (0 if flag in PASS_FLAGS else 1)
+        groups, inverse = np.unique(self._row_periods(by), return_inverse=True)
+        counts = np.bincount(inverse, weights=valid, minlength=len(groups))
+        fails = np.bincount(inverse, weights=failed & valid, minlength=len(groups))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = fails / counts
+        return pd.DataFrame({by: groups, "FailRate": rate, "Count": counts.astype(np.int64)})
+
+    def mean(self, metric: str, by: str = "day") -> pd.DataFrame:
+        """NaN-aware mean of a numeric ``metric`` per ``day``, ``month`` or ``run``."""
+        if metric not in NUM_METRICS:
+            raise KeyError(f"Unknown metric: {metric}")
+        values = self.column(metric).astype(np.float64)
+        valid = ~np.isnan(values)
+        groups, inverse = np.unique(self._row_periods(by), return_inverse=True)
+        counts = np.bincount(inverse, weights=valid, minlength=len(groups))
+        sums = np.bincount(inverse, weights=np.where(valid, values, 0.0), minlength=len(groups))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return pd.DataFrame({by: groups, metric: means, "Count": counts.astype(np.int64)})
+
+    def to_frame(self, run: Optional[int] = None) -> pd.DataFrame:
+        """Return the rows of ``run`` (or all rows) with the ``compute_metrics`` columns."""
+        if run is None:
+            rows = slice(None)
+        else:
+            start = sum(r["rows"] for r in self.runs[:run])
+            rows = slice(start, start + self.runs[run]["rows"])
+        paths = np.asarray(self.paths, dtype=object)
+        data = {"path": paths[self.column("path_id")[rows]] if self.paths else []}
+        for name in RESULT_COLUMNS[1:]:
+            values = self.column(name)[rows]
+            if name in BOOL_METRICS:
+                data[name] = pd.Series(values == 1).where(values != MISSING_BOOL)
+            elif name in _INT_METRICS:
+                data[name] = pd.Series(values.astype(np.float64)).round().astype("Int64")
+            else:
+                data[name] = np.array(values)
+        return pd.DataFrame(data)
+
+    def record(self, row: int) -> dict:
+        """Return one row as a ``compute_metrics`` result dict (values read back as float32)."""
+        if not 0 <= row < self.rows:
+            raise IndexError(f"Row {row} out of range")
+        res = {"path": self.paths[int(self.column("path_id")[row])]}
+        for name in RESULT_COLUMNS[1:]:
+            value = self.column(name)[row]
+            if name in BOOL_METRICS:
+                res[name] = None if value == MISSING_BOOL else bool(value == 1)
+            elif name in _INT_METRICS:
+                res[name] = int(round(float(value))) if not np.isnan(value) else None
+            else:
+                res[name] = float(value)
+        return res
+
+    def export_csv(self, output: str, run: Optional[int] = None) -> None:
+        """Write rows in the CSV layout read by ``compare_metrics.py``."""
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        self.to_frame(run).to_csv(output, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar store for historical quality metrics")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Store directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Append metrics CSV files, one run each")
+    ingest.add_argument("csv", nargs="+")
+    ingest.add_argument("--date", help="Run date (YYYY-MM-DD); defaults to the file modification time")
+
+    rate = sub.add_parser("fail-rate", help="Fail rate of a flag over time")
+    rate.add_argument("--flag", default="IsBlurry", choices=BOOL_METRICS)
+    rate.add_argument("--by", default="day", choices=["day", "month", "run"])
+
+    mean = sub.add_parser("mean", help="Mean of a numeric metric over time")
+    mean.add_argument("--metric", default="BlurScore", choices=NUM_METRICS)
+    mean.add_argument("--by", default="day", choices=["day", "month", "run"])
+
+    export = sub.add_parser("export", help="Export rows to the metrics CSV format")
+    export.add_argument("--run", type=int, default=None, help="Run id (default: all rows)")
+    export.add_argument("--output", default=os.path.join("reports", "metrics_per_image_py.csv"))
+
+    sub.add_parser("runs", help="List stored runs")
+    args = parser.parse_args()
+
+    store = MetricsStore(args.store)
+    if args.command == "ingest":
+        timestamp = dt.datetime.fromisoformat(args.date) if args.date else None
+        for csv_path in args.csv:
+            run_id = store.ingest_csv(csv_path, timestamp)
+            print(f"Ingested {csv_path} as run {run_id} ({store.runs[run_id]['rows']} rows)")
+    elif args.command == "fail-rate":
+        print(store.fail_rate(args.flag, args.by).to_string(index=False))
+    elif args.command == "mean":
+        print(store.mean(args.metric, args.by).to_string(index=False))
+    elif args.command == "export":
+        store.export_csv(args.output, args.run)
+        print(f"Exported to {args.output}")
+    else:
+        for run in store.runs:
+            print(f"{run['id']:>4}  {run['timestamp']}  {run['rows']:>8}  {run['source']}")
+
+
+if __name__ == "__main__":
+    main()
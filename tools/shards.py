@@ -0,0 +1,347 @@
+"""Sharded archive format for image datasets.
+
+A shard is an uncompressed tar file (``shard-00000.tar``) readable with any
+tar tool, next to an offset index (``shard-00000.tar.idx``) with one
+``name<TAB>offset<TAB>size`` line per member giving the position of the raw
+file bytes inside the tar. Readers memory-map the tar and slice members
+straight out of the mapping, so a batch run opens a handful of shards
+instead of one file per image and can iterate sequentially or jump to any
+member.
+
+An image inside a shard is referenced as ``<shard path>#<member name>``;
+``compute_metrics`` accepts these references wherever it accepts a path.
+
+Usage::
+
+    python tools/shards.py convert --src data/sample_50.txt --out-dir data/shards
+    python tools/shards.py convert --src docs/dataset_samples --out-dir data/docs_shards
+    python tools/shards.py index some_archive.tar
+    python tools/shards.py score --shards "data/shards/*.tar" --output reports/metrics_per_image_py.csv
+"""
+import argparse
+import glob
+import mmap
+import os
+import random
+import sys
+import tarfile
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+INDEX_SUFFIX = ".idx"
+REF_SEPARATOR = "#"
+
+
+def index_path(shard: str) -> str:
+    return shard + INDEX_SUFFIX
+
+
+def write_index(shard: str, entries: Iterable[Tuple[str, int, int]]) -> None:
+    with open(index_path(shard), "w", encoding="utf-8") as fh:
+        for name, offset, size in entries:
+            fh.write(f"{name}\t{offset}\t{size}\n")
+
+
+def build_index(shard: str) -> List[Tuple[str, int, int]]:
+    """Scan a tar file and write its offset index."""
+    with tarfile.open(shard, "r:") as tar:
+        entries = [(m.name, m.offset_data, m.size) for m in tar if m.isfile()]
+    write_index(shard, entries)
+    return entries
+
+
+def split_ref(ref: str) -> Optional[Tuple[str, str]]:
+    """Split ``shard.tar#member`` into its parts, or return ``None``."""
+    shard, sep, name = ref.partition(REF_SEPARATOR)
+    if sep and shard.endswith(".tar") and not os.path.exists(ref):
+        return shard, name
+    return None
+
+
+class ShardWriter:
+    """Write members into tar shards of bounded item count and size."""
+
+    def __init__(self, out_dir: str, shard_size: int = 1000, max_bytes: Optional[int] = None,
+                 prefix: str = "shard"):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.shards: List[str] = []
+        self._tar: Optional[tarfile.TarFile] = None
+        self._entries: List[Tuple[str, int, int]] = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add(self, name: str, data: bytes) -> str:
+        """Append ``data`` as member ``name`` and return its reference."""
+        full = self._tar is not None and (
+            len(self._entries) >= self.shard_size
+            or (self.max_bytes is not None and self._tar.offset + len(data) > self.max_bytes)
+        )
+        if self._tar is None or full:
+            self.close()
+            shard = os.path.join(self.out_dir, f"{self.prefix}-{len(self.shards):05d}.tar")
+            self.shards.append(shard)
+            self._tar = tarfile.open(shard, "w", format=tarfile.PAX_FORMAT)
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = 0
+        self._tar.addfile(info, BytesIO(data))
+        # The data block ends the member, padded to 512 bytes.
+        offset = self._tar.offset - -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        self._entries.append((name, offset, len(data)))
+        return f"{self.shards[-1]}{REF_SEPARATOR}{name}"
+
+    def close(self) -> None:
+        if self._tar is not None:
+            self._tar.close()
+            write_index(self.shards[-1], self._entries)
+            self._tar = None
+            self._entries = []
+
+
+class ShardReader:
+    """Memory-mapped random and sequential access to one shard."""
+
+    def __init__(self, shard: str):
+        self.shard = shard
+        if not os.path.exists(index_path(shard)):
+            entries = build_index(shard)
+        else:
+            with open(index_path(shard), "r", encoding="utf-8") as fh:
+                entries = []
+                for line in fh:
+                    name, offset, size = line.rstrip("\n").split("\t")
+                    entries.append((name, int(offset), int(size)))
+        self.entries = entries
+        self._positions = {name: i for i, (name, _, _) in enumerate(entries)}
+        self._fh = open(shard, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if entries else None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._positions
+
+    def __enter__(self) -> "ShardReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fh.close()
+
+    def names(self) -> List[str]:
+        return [name for name, _, _ in self.entries]
+
+    def buffer(self, key) -> np.ndarray:
+        """Zero-copy uint8 view of a member, by position or name."""
+        position = key if isinstance(key, int) else self._positions[key]
+        _, offset, size = self.entries[position]
+        return np.frombuffer(self._mm, dtype=np.uint8, count=size, offset=offset)
+
+    def read(self, key) -> bytes:
+        return self.buffer(key).tobytes()
+
+    def decode(self, key, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+        img = cv2.imdecode(self.buffer(key), flags)
+        if img is None:
+            raise ValueError(f"Unable to decode {self.shard}{REF_SEPARATOR}{key}")
+        return img
+
+    def __iter__(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """Yield ``(name, buffer)`` in file order."""
+        for position, (name, _, _) in enumerate(self.entries):
+            yield name, self.buffer(position)
+
+
+class ShardDataset:
+    """A set of shards addressed as one sequence of members."""
+
+    def __init__(self, shards: Iterable[str]):
+        self.readers = [ShardReader(s) for s in sorted(shards)]
+        self._starts = np.cumsum([0] + [len(r) for r in self.readers])
+
+    @classmethod
+    def from_pattern(cls, pattern: str) -> "ShardDataset":
+        return cls(glob.glob(pattern))
+
+    def __len__(self) -> int:
+        return int(self._starts[-1])
+
+    def close(self) -> None:
+        for reader in self.readers:
+            reader.close()
+
+    def locate(self, index: int) -> Tuple[ShardReader, int]:
+        shard = int(np.searchsorted(self._starts, index, side="right")) - 1
+        return self.readers[shard], index - int(self._starts[shard])
+
+    def ref(self, index: int) -> str:
+        reader, position = self.locate(index)
+        return f"{reader.shard}{REF_SEPARATOR}{reader.entries[position][0]}"
+
+    def buffer(self, index: int) -> np.ndarray:
+        reader, position = self.locate(index)
+        return reader.buffer(position)
+
+    def decode(self, index: int) -> np.ndarray:
+        reader, position = self.locate(index)
+        return reader.decode(position)
+
+    def __iter__(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """Yield ``(ref, buffer)`` for every member, shard by shard."""
+        for reader in self.readers:
+            for name, buf in reader:
+                yield f"{reader.shard}{REF_SEPARATOR}{name}", buf
+
+    def sample(self, k: int, seed: int = 0) -> List[int]:
+        return sorted(random.Random(seed).sample(range(len(self)), min(k, len(self))))
+
+
+# Shards kept mapped by ``read_ref``; the least recently used one is closed
+# beyond this, so a large corpus does not exhaust file descriptors.
+MAX_OPEN_READERS = 64
+# shard -> [reader, decodes in progress]
+_OPEN_READERS: "OrderedDict[str, list]" = OrderedDict()
+_OPEN_READERS_LOCK = threading.Lock()
+
+
+def read_ref(ref: str, flags: int = cv2.IMREAD_COLOR) -> Optional[np.ndarray]:
+    """Decode ``shard.tar#member``, or ``None`` when the member is not in the shard.
+
+    Up to ``MAX_OPEN_READERS`` shard mappings stay open for reuse.
+    """
+    parts = split_ref(ref)
+    if parts is None:
+        return None
+    shard, name = parts
+    with _OPEN_READERS_LOCK:
+        entry = _OPEN_READERS.get(shard)
+        if entry is None:
+            entry = _OPEN_READERS[shard] = [ShardReader(shard), 0]
+            while len(_OPEN_READERS) > MAX_OPEN_READERS:
+                _, (old, users) = _OPEN_READERS.popitem(last=False)
+                if users == 0:
+                    old.close()
+        else:
+            _OPEN_READERS.move_to_end(shard)
+        reader = entry[0]
+        if name not in reader:
+            return None
+        entry[1] += 1
+    try:
+        return cv2.imdecode(reader.buffer(name), flags)
+    finally:
+        with _OPEN_READERS_LOCK:
+            entry[1] -= 1
+            # Evicted while decoding: the last user closes it.
+            if entry[1] == 0 and _OPEN_READERS.get(shard) is not entry:
+                reader.close()
+
+
+def source_files(src: str) -> List[Tuple[str, str]]:
+    """Return ``(file path, member name)`` pairs for a folder or a sample list."""
+    if os.path.isdir(src):
+        root = Path(src)
+        files = sorted(p for p in root.rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return [(str(p), p.relative_to(root).as_posix()) for p in files]
+    from compute_metrics_py import read_paths
+
+    return [(p, Path(p).as_posix().lstrip("/")) for p in read_paths(src)]
+
+
+def convert(src: str, out_dir: str, shard_size: int = 1000, max_bytes: Optional[int] = None) -> List[str]:
+    """Pack the images of a folder or sample list into shards; returns their paths."""
+    with ShardWriter(out_dir, shard_size, max_bytes) as writer:
+        for path, name in source_files(src):
+            with open(path, "rb") as fh:
+                writer.add(name, fh.read())
+    return writer.shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, index and score sharded image archives")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    conv = sub.add_parser("convert", help="Pack a folder or sample list into shards")
+    conv.add_argument("--src", required=True, help="Image folder or file with a list of image paths")
+    conv.add_argument("--out-dir", required=True)
+    conv.add_argument("--shard-size", type=int, default=1000, help="Maximum images per shard")
+    conv.add_argument("--shard-mb", type=int, default=None, help="Maximum shard size in MiB")
+    conv.add_argument("--sample", default=None, help="Also write a sample list of shard references")
+
+    idx = sub.add_parser("index", help="Build the offset index of existing tar files")
+    idx.add_argument("tars", nargs="+")
+
+    score = sub.add_parser("score", help="Compute metrics for every image in the shards")
+    score.add_argument("--shards", required=True, help="Glob pattern of shard files")
+    score.add_argument("--output", default=os.path.join("reports", "metrics_per_image_py.csv"))
+    score.add_argument("--random", type=int, default=None, help="Score a random subset of N images")
+    score.add_argument("--no-brisque", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        start = time.time()
+        max_bytes = args.shard_mb * 1024 * 1024 if args.shard_mb else None
+        shards = convert(args.src, args.out_dir, args.shard_size, max_bytes)
+        dataset = ShardDataset(shards)
+        print(f"Packed {len(dataset)} images into {len(shards)} shards in {time.time() - start:.2f}s")
+        if args.sample:
+            with open(args.sample, "w", encoding="utf-8") as fh:
+                for i in range(len(dataset)):
+                    fh.write(dataset.ref(i) + "\n")
+        dataset.close()
+    elif args.command == "index":
+        for tar in args.tars:
+            print(f"{tar}: {len(build_index(tar))} members indexed")
+    else:
+        import pandas as pd
+        from tqdm import tqdm
+        from compute_metrics_py import compute_image_metrics
+
+        dataset = ShardDataset.from_pattern(args.shards)
+        indices = dataset.sample(args.random) if args.random is not None else range(len(dataset))
+        results = []
+        start = time.time()
+        for i in tqdm(indices, desc="Processing"):
+            ref = dataset.ref(i)
+            item_start = time.time()
+            img = cv2.imdecode(dataset.buffer(i), cv2.IMREAD_COLOR)
+            if img is None:
+                print(f"Error processing {ref}: unable to decode")
+                continue
+            results.append(compute_image_metrics(img, ref, start=item_start, brisque=not args.no_brisque))
+        elapsed = time.time() - start
+        dataset.close()
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        pd.DataFrame(results).to_csv(args.output, index=False)
+        print(f"Scored {len(results)} images in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Multi-process scoring pool that exchanges decoded images via shared memory.
+
+A single decoder process reads images with ``read_image`` (plain files or
+``shard.tar#member`` references) and writes the pixels into one of a fixed
+number of slots of a ``multiprocessing.shared_memory`` ring buffer. Metric workers map the slot as a NumPy view, run
+``compute_image_metrics`` on it in place and hand the slot back, so decoded
+pixels never go through pickle. The segment is allocated once and reused for
+the lifetime of the pool. Images larger than a slot are decoded by the worker
+itself.
+
+A process that dies (e.g. a native crash while decoding) would never hand
+its slot back; the caller polls the result queue and fails the batch with
+``RuntimeError`` as soon as any process is found dead, instead of hanging.
+
+Usage::
+
+    python tools/shm_pool.py --sample data/sample_50.txt --workers 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from compute_metrics_py import compute_image_metrics, compute_metrics, read_image, read_paths  # noqa: E402
+
+DEFAULT_SLOT_BYTES = 64 * 1024 * 1024
+# How often the caller checks that the processes are alive while waiting.
+RESULT_POLL_SECONDS = 1.0
+
+
+def _decoder_loop(shm_name: str, slot_bytes: int, jobs, free, tasks, results, workers: int) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            index, path = job
+            start = time.time()
+            try:
+                img = read_image(path)
+            except Exception as exc:  # pragma: no cover
+                results.put((index, path, None, str(exc)))
+                continue
+            if img is None:
+                results.put((index, path, None, f"Unable to read image: {path}"))
+                continue
+            decode_ms = (time.time() - start) * 1000.0
+            if img.nbytes > slot_bytes:
+                tasks.put((index, path, None, None, decode_ms))
+                continue
+            slot = free.get()
+            view = np.ndarray(img.shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            view[...] = img
+            del view
+            tasks.put((index, path, slot, img.shape, decode_ms))
+    finally:
+        for _ in range(workers):
+            tasks.put(None)
+        shm.close()
+
+
+def _worker_loop(shm_name: str, slot_bytes: int, free, tasks, results) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, path, slot, shape, decode_ms = task
+            try:
+                if slot is None:
+                    res = compute_metrics(path)
+                else:
+                    view = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                    try:
+                        res = compute_image_metrics(view, path, start=time.time() - decode_ms / 1000.0)
+                    finally:
+                        del view
+                        free.put(slot)
+                results.put((index, path, res, None))
+            except Exception as exc:  # pragma: no cover
+                results.put((index, path, None, str(exc)))
+    finally:
+        shm.close()
+
+
+class SharedMemoryScoringPool:
+    """Decoder process feeding metric workers through a shared-memory ring.
+
+    Parameters
+    ----------
+    workers: int
+        Number of metric worker processes.
+    slots: int, optional
+        Number of image slots in the ring; defaults to twice ``workers``.
+    slot_bytes: int
+        Size of each slot, i.e. the largest decoded image (H*W*3 bytes)
+        transported through shared memory.
+    """
+
+    def __init__(self, workers: int = os.cpu_count() or 1, slots: Optional[int] = None,
+                 slot_bytes: int = DEFAULT_SLOT_BYTES):
+        self.workers = workers
+        self.slots = slots or 2 * workers
+        self.slot_bytes = slot_bytes
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._processes: List[mp.Process] = []
+        self._broken = False
+
+    def __enter__(self) -> "SharedMemoryScoringPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        ctx = mp.get_context()
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self._jobs = ctx.Queue()
+        self._free = ctx.Queue()
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        name = self._shm.name
+        self._processes = [
+            ctx.Process(
+                target=_decoder_loop,
+                args=(name, self.slot_bytes, self._jobs, self._free, self._tasks, self._results, self.workers),
+                daemon=True,
+            )
+        ]
+        self._processes += [
+            ctx.Process(
+                target=_worker_loop,
+                args=(name, self.slot_bytes, self._free, self._tasks, self._results),
+                daemon=True,
+            )
+            for _ in range(self.workers)
+        ]
+        for proc in self._processes:
+            proc.start()
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        if self._broken:
+            for proc in self._processes:
+                proc.terminate()
+        else:
+            self._jobs.put(None)
+        for proc in self._processes:
+            proc.join()
+        self._processes = []
+        self._broken = False
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def imap_unordered(self, paths: Iterable[str]) -> Iterator[Tuple[int, str, Optional[dict], Optional[str]]]:
+        """Yield ``(index, path, metrics, error)`` as workers finish."""
+        if self._shm is None:
+            raise RuntimeError("Pool is not started")
+        if self._broken:
+            raise RuntimeError("Pool is broken; close it and start a new one")
+        count = 0
+        for index, path in enumerate(paths):
+            self._jobs.put((index, path))
+            count += 1
+        for _ in range(count):
+            while True:
+                try:
+                    item = self._results.get(timeout=RESULT_POLL_SECONDS)
+                    break
+                except queue.Empty:
+                    self._check_processes()
+            yield item
+
+    def _check_processes(self) -> None:
+        for proc in self._processes:
+            if not proc.is_alive():
+                self._broken = True
+                raise RuntimeError(f"Scoring process {proc.name} exited with code {proc.exitcode}; batch aborted")
+
+    def map(self, paths: Iterable[str]) -> List[Optional[dict]]:
+        """Score ``paths`` and return the metrics in input order (``None`` on error)."""
+        paths = list(paths)
+        ordered: List[Optional[dict]] = [None] * len(paths)
+        for index, path, res, error in self.imap_unordered(paths):
+            if error is not None:
+                print(f"Error processing {path}: {error}")
+            ordered[index] = res
+        return ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute quality metrics with a shared-memory worker pool")
+    parser.add_argument(
+        "--sample",
+        default=os.path.join("data", "sample_50.txt"),
+        help="File with list of image paths",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join("reports", "metrics_per_image_py.csv"),
+        help="Output CSV path",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--slots", type=int, default=None, help="Ring buffer slots (default: 2 x workers)")
+    parser.add_argument("--slot-mb", type=int, default=DEFAULT_SLOT_BYTES // (1024 * 1024),
+                        help="Size of one slot in MiB")
+    args = parser.parse_args()
+
+    paths = read_paths(args.sample)
+    start = time.time()
+    with SharedMemoryScoringPool(args.workers, args.slots, args.slot_mb * 1024 * 1024) as pool:
+        results = [r for r in pool.map(paths) if r is not None]
+    elapsed = time.time() - start
+
+    df = pd.DataFrame(results)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    df.to_csv(args.output, index=False)
+    print(f"Scored {len(results)}/{len(paths)} images in {elapsed:.2f}s "
+          f"({len(results) / elapsed if elapsed > 0 else float('nan'):.1f} images/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""In-process thread-pool scoring backend.
+
+The metric path spends nearly all of its time in OpenCV calls, which release
+the GIL: the per-check reductions use ``cv2.meanStdDev``, ``cv2.norm``,
+``cv2.mean``, ``cv2.countNonZero`` and ``cv2.reduce`` instead of NumPy
+reductions with Python-level temporaries, and BRISQUE fits use ``cv2.norm``
+on the MSCN maps. Threads therefore score images in parallel inside one
+process, which suits web workers where forking a process pool is awkward.
+
+OpenCV's own thread pool is limited to one thread while any pool is open so
+the threads do not oversubscribe the cores. The setting is process-global:
+it is reference-counted across pools and restored when the last one
+closes, and other OpenCV code in the process also runs single-threaded
+meanwhile.
+
+``--bench`` scores the sample with each thread count and prints throughput
+and scaling against one thread.
+
+Usage::
+
+    python tools/thread_pool.py --sample data/sample_50.txt --threads 8
+    python tools/thread_pool.py --sample data/sample_50.txt --bench 1,2,4,8 --no-brisque
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from compute_metrics_py import compute_metrics, load_brisque, read_paths  # noqa: E402
+
+_cv2_lock = threading.Lock()
+_cv2_users = 0
+_cv2_saved_threads: Optional[int] = None
+
+
+def _acquire_single_threaded_cv2() -> None:
+    global _cv2_users, _cv2_saved_threads
+    with _cv2_lock:
+        if _cv2_users == 0:
+            _cv2_saved_threads = cv2.getNumThreads()
+            cv2.setNumThreads(1)
+        _cv2_users += 1
+
+
+def _release_single_threaded_cv2() -> None:
+    global _cv2_users
+    with _cv2_lock:
+        _cv2_users -= 1
+        if _cv2_users == 0:
+            cv2.setNumThreads(_cv2_saved_threads)
+
+
+class ThreadScoringPool:
+    """Score images with ``compute_metrics`` on a pool of threads.
+
+    Parameters
+    ----------
+    threads: int
+        Number of scoring threads.
+    brisque: bool
+        Compute ``BrisqueScore``; the model is loaded once and shared.
+    """
+
+    def __init__(self, threads: int = os.cpu_count() or 1, brisque: bool = True):
+        self.threads = threads
+        self.brisque = brisque
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> "ThreadScoringPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if self.brisque:
+            load_brisque()
+        _acquire_single_threaded_cv2()
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="score")
+
+    def close(self) -> None:
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        _release_single_threaded_cv2()
+
+    def _score(self, index: int, path: str) -> Tuple[int, str, Optional[dict], Optional[str]]:
+        try:
+            return index, path, compute_metrics(path, brisque=self.brisque), None
+        except Exception as exc:  # pragma: no cover
+            return index, path, None, str(exc)
+
+    def imap_unordered(self, paths: Iterable[str]) -> Iterator[Tuple[int, str, Optional[dict], Optional[str]]]:
+        """Yield ``(index, path, metrics, error)`` as threads finish."""
+        if self._executor is None:
+            raise RuntimeError("Pool is not started")
+        futures = [self._executor.submit(self._score, i, p) for i, p in enumerate(paths)]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def map(self, paths: Iterable[str]) -> List[Optional[dict]]:
+        """Score ``paths`` and return the metrics in input order (``None`` on error)."""
+        paths = list(paths)
+        ordered: List[Optional[dict]] = [None] * len(paths)
+        for index, path, res, error in self.imap_unordered(paths):
+            if error is not None:
+                print(f"Error processing {path}: {error}")
+            ordered[index] = res
+        return ordered
+
+
+def benchmark(paths: List[str], thread_counts: List[int], brisque: bool = True, repeat: int = 1) -> List[dict]:
+    """Images/s for each thread count, with speedup over the first count."""
+    rows = []
+    work = paths * repeat
+    with ThreadScoringPool(1, brisque) as warm:
+        warm.map(paths[:1])
+    for threads in thread_counts:
+        with ThreadScoringPool(threads, brisque) as pool:
+            start = time.perf_counter()
+            pool.map(work)
+            elapsed = time.perf_counter() - start
+        rows.append({"Threads": threads, "Seconds": elapsed, "ImagesPerSec": len(work) / elapsed})
+    base = rows[0]["ImagesPerSec"] / rows[0]["Threads"]
+    for row in rows:
+        row["Speedup"] = row["ImagesPerSec"] / rows[0]["ImagesPerSec"]
+        row["Efficiency"] = row["ImagesPerSec"] / (base * row["Threads"])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute quality metrics with an in-process thread pool")
+    parser.add_argument(
+        "--sample",
+        default=os.path.join("data", "sample_50.txt"),
+        help="File with list of image paths",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join("reports", "metrics_per_image_py.csv"),
+        help="Output CSV path",
+    )
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-brisque", action="store_true")
+    parser.add_argument("--bench", default=None, help="Comma-separated thread counts to benchmark, e.g. 1,2,4,8")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the sample per benchmark run")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    paths = read_paths(args.sample)
+    if args.bench:
+        counts = [int(c) for c in args.bench.split(",")]
+        rows = benchmark(paths, counts, brisque=not args.no_brisque, repeat=args.repeat)
+        print(f"{os.cpu_count()} CPUs")
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+        return
+
+    start = time.time()
+    with ThreadScoringPool(args.threads, brisque=not args.no_brisque) as pool:
+        results = [r for r in pool.map(paths) if r is not None]
+    elapsed = time.time() - start
+
+    df = pd.DataFrame(results)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    df.to_csv(args.output, index=False)
+    print(f"Scored {len(results)}/{len(paths)} images in {elapsed:.2f}s "
+          f"({len(results) / elapsed if elapsed > 0 else float('nan'):.1f} images/s)")
+
+
+if __name__ == "__main__":
+    main()
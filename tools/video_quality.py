@@ -0,0 +1,224 @@
+"""Score video files and capture bursts frame by frame.
+
+Frames are decoded sequentially (``cv2.VideoCapture`` for videos,
+``cv2.imread`` for burst folders or sample lists). A cheap difference gate on
+a small grayscale thumbnail decides whether a frame is a near-duplicate of
+the last fully scored one; near-duplicates reuse its metrics instead of
+running ``compute_image_metrics`` again. The best frame of every burst is
+tracked in the same pass.
+
+Usage::
+
+    python tools/video_quality.py --video clip.mp4 --burst-size 30
+    python tools/video_quality.py --burst captures/burst_01 --burst captures/burst_02
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import pandas as pd
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from compute_metrics_py import compute_image_metrics, failed_checks, read_paths  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+SIGNATURE_SIZE = (64, 64)
+
+
+def frame_signature(img: np.ndarray) -> np.ndarray:
+    """Return the small grayscale thumbnail used by the difference gate."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def frame_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference (0-255) between two frame signatures."""
+    return float(cv2.mean(cv2.absdiff(a, b))[0])
+
+
+def quality_key(metrics: dict) -> Tuple[int, float]:
+    """Sort key for picking the best frame: fewest failed checks, then sharpest."""
+    return (-len(failed_checks(metrics)), metrics["BlurScore"])
+
+
+def iter_video_frames(video_path: str) -> Iterator[Tuple[str, np.ndarray]]:
+    """Yield ``(name, frame)`` for every frame of ``video_path`` in order."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Unable to open video: {video_path}")
+    try:
+        index = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield f"{video_path}#{index}", frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def iter_image_frames(paths: Iterable[str]) -> Iterator[Tuple[str, np.ndarray]]:
+    """Yield ``(path, image)`` for every readable image in ``paths``."""
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"Error processing {path}: unable to read image")
+            continue
+        yield path, img
+
+
+def burst_paths(source: str) -> List[str]:
+    """Return the frame paths of a burst folder or sample list file."""
+    if os.path.isdir(source):
+        return [
+            os.path.join(source, name)
+            for name in sorted(os.listdir(source))
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+    return read_paths(source)
+
+
+class TemporalScorer:
+    """Score a stream of frames, reusing metrics for near-duplicates.
+
+    Parameters
+    ----------
+    diff_threshold: float
+        Frames whose signature differs from the last scored frame by less
+        than this mean absolute difference reuse its metrics.
+    burst_size: int
+        Number of frames per burst; ``0`` treats the whole stream as a
+        single burst unless a scene change splits it.
+    scene_threshold: float, optional
+        Difference to the previous frame above which a new burst starts.
+    """
+
+    def __init__(self, diff_threshold: float = 2.0, burst_size: int = 0,
+                 scene_threshold: Optional[float] = None):
+        self.diff_threshold = diff_threshold
+        self.burst_size = burst_size
+        self.scene_threshold = scene_threshold
+        self.frames = 0
+        self.scored = 0
+        self.best: List[dict] = []
+        self._burst = 0
+        self._burst_frames = 0
+        self._burst_best: Optional[dict] = None
+        self._last_signature: Optional[np.ndarray] = None
+        self._key_signature: Optional[np.ndarray] = None
+        self._key_metrics: Optional[dict] = None
+
+    def process(self, name: str, img: np.ndarray) -> dict:
+        """Score one frame and return its metrics record."""
+        start = time.time()
+        signature = frame_signature(img)
+
+        new_burst = self.burst_size > 0 and self._burst_frames >= self.burst_size
+        if (
+            self.scene_threshold is not None
+            and self._last_signature is not None
+            and frame_difference(signature, self._last_signature) > self.scene_threshold
+        ):
+            new_burst = True
+        if new_burst and self._burst_frames:
+            self.flush()
+            self._burst += 1
+
+        reused = (
+            self._key_signature is not None
+            and frame_difference(signature, self._key_signature) < self.diff_threshold
+        )
+        if reused:
+            metrics = dict(self._key_metrics)
+            metrics["path"] = name
+            metrics["ElapsedMs"] = (time.time() - start) * 1000.0
+        else:
+            metrics = compute_image_metrics(img, name, start=start)
+            self._key_signature = signature
+            self._key_metrics = metrics
+            self.scored += 1
+        metrics["Burst"] = self._burst
+        metrics["Reused"] = reused
+
+        self._last_signature = signature
+        self._burst_frames += 1
+        self.frames += 1
+        if self._burst_best is None or quality_key(metrics) > quality_key(self._burst_best):
+            self._burst_best = metrics
+        return metrics
+
+    def flush(self) -> Optional[dict]:
+        """Close the current burst and return its best frame, if any."""
+        best = self._burst_best
+        if best is not None:
+            self.best.append(best)
+        self._burst_best = None
+        self._burst_frames = 0
+        # Bursts never share a reference frame.
+        self._key_signature = None
+        self._key_metrics = None
+        self._last_signature = None
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score video frames and bursts, selecting the best frame per burst")
+    parser.add_argument("--video", action="append", default=[], help="Video file to score (repeatable)")
+    parser.add_argument(
+        "--burst",
+        action="append",
+        default=[],
+        help="Burst folder or file with a list of frame paths (repeatable)",
+    )
+    parser.add_argument("--diff-threshold", type=float, default=2.0,
+                        help="Mean abs difference below which a frame reuses the previous metrics")
+    parser.add_argument("--burst-size", type=int, default=0, help="Frames per burst (0 = whole input)")
+    parser.add_argument("--scene-threshold", type=float, default=None,
+                        help="Frame difference that starts a new burst")
+    parser.add_argument("--output", default=os.path.join("reports", "video_frames_py.csv"))
+    parser.add_argument("--best-output", default=os.path.join("reports", "video_best_py.csv"))
+    args = parser.parse_args()
+
+    if not args.video and not args.burst:
+        parser.error("at least one --video or --burst input is required")
+
+    frames: List[dict] = []
+    best: List[dict] = []
+    total_frames = 0
+    total_scored = 0
+    start = time.time()
+    inputs = [(v, iter_video_frames(v)) for v in args.video]
+    inputs += [(b, iter_image_frames(burst_paths(b))) for b in args.burst]
+    for source, stream in inputs:
+        scorer = TemporalScorer(args.diff_threshold, args.burst_size, args.scene_threshold)
+        for name, img in stream:
+            record = scorer.process(name, img)
+            record["Source"] = source
+            frames.append(record)
+        scorer.flush()
+        best.extend(scorer.best)
+        total_frames += scorer.frames
+        total_scored += scorer.scored
+    elapsed = time.time() - start
+
+    for path, df in ((args.output, pd.DataFrame(frames)), (args.best_output, pd.DataFrame(best))):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        df.to_csv(path, index=False)
+
+    fps = total_frames / elapsed if elapsed > 0 else float("nan")
+    print(f"Frames: {total_frames}  scored: {total_scored}  reused: {total_frames - total_scored}")
+    print(f"Bursts: {len(best)}  elapsed: {elapsed:.2f}s  throughput: {fps:.1f} frames/s")
+    print(f"Per-frame metrics written to {args.output}")
+    print(f"Best frame per burst written to {args.best_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Score images as soon as they land in a hot folder.
+
+New files are detected with inotify on Linux (through ``ctypes``, no extra
+dependency) and by polling ``os.scandir`` elsewhere or with ``--poll``. A
+file is scored once its size and modification time have not changed for
+``--debounce`` seconds after the last event, so images still being written
+by a scanner or copied over the network are not read half-way.
+
+Ready files go to a process pool that is started, and whose workers load
+the BRISQUE model and run one warm-up image, before watching begins. Results
+are appended to a :class:`MetricsStore` in small runs (every ``--flush-rows``
+results or ``--flush-seconds``), and the latency of every file, from its
+last write to its result, is printed.
+
+Only the top level of the folder is watched. Files already present are
+skipped unless ``--existing`` is given.
+
+Usage::
+
+    python tools/watch_folder.py incoming/ --store reports/metrics_store --workers 4
+    python tools/watch_folder.py incoming/ --poll --interval 1.0 --existing
+"""
+import argparse
+import ctypes
+import ctypes.util
+import multiprocessing as mp
+import os
+import queue
+import select
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from compute_metrics_py import compute_image_metrics, compute_metrics, failed_checks, load_brisque  # noqa: E402
+from metrics_store import DEFAULT_STORE, MetricsStore  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+DEFAULT_DEBOUNCE = 0.5
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+_libc_loaded = False
+
+
+def load_inotify():
+    """Return libc when it provides inotify, else ``None``."""
+    global _libc, _libc_loaded
+    if not _libc_loaded:
+        _libc = None
+        if sys.platform.startswith("linux"):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                _libc = libc
+            except (OSError, AttributeError):
+                _libc = None
+        _libc_loaded = True
+    return _libc
+
+
+def is_image(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class InotifyWatcher:
+    """Names of files created, written or moved into ``folder``."""
+
+    def __init__(self, folder: str):
+        libc = load_inotify()
+        if libc is None:
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {folder}")
+        self.folder = folder
+
+    def events(self, timeout: float) -> List[str]:
+        """Wait up to ``timeout`` seconds and return the paths that changed."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+            if name:
+                paths.append(os.path.join(self.folder, name))
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback that rescans ``folder`` every ``interval`` seconds."""
+
+    def __init__(self, folder: str, interval: float = 1.0):
+        self.folder = folder
+        self.interval = interval
+        self._seen: Dict[str, Tuple[int, int]] = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        entries = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        entries[entry.path] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+        return entries
+
+    def events(self, timeout: float) -> List[str]:
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = [p for p, sig in current.items() if self._seen.get(p) != sig]
+        self._seen = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class Debouncer:
+    """Hold paths until they stop changing for ``delay`` seconds."""
+
+    def __init__(self, delay: float = DEFAULT_DEBOUNCE):
+        self.delay = delay
+        # path -> (size, mtime_ns, time of last change)
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, path: str, now: float) -> None:
+        sig = _stat(path)
+        if sig is None:
+            self._pending.pop(path, None)
+            return
+        prev = self._pending.get(path)
+        if prev is None or prev[:2] != sig:
+            self._pending[path] = (sig[0], sig[1], now)
+
+    def ready(self, now: float) -> List[str]:
+        """Paths unchanged for ``delay`` seconds; they are removed from the pending set."""
+        done = []
+        for path, (size, mtime, changed) in list(self._pending.items()):
+            if now - changed < self.delay:
+                continue
+            sig = _stat(path)
+            if sig is None:
+                del self._pending[path]
+            elif sig != (size, mtime):
+                self._pending[path] = (sig[0], sig[1], now)
+            elif size > 0:
+                del self._pending[path]
+                done.append(path)
+        return done
+
+
+def _init_worker(brisque: bool) -> None:
+    import cv2
+    import numpy as np
+
+    cv2.setNumThreads(1)
+    if brisque:
+        load_brisque()
+    # First call pays for lazy imports and cached tables, not the first file.
+    warm = np.random.default_rng(0).integers(0, 256, size=(64, 64, 3), dtype=np.uint8)
+    compute_image_metrics(warm, brisque=brisque)
+
+
+def _score(path: str, brisque: bool) -> dict:
+    return compute_metrics(path, brisque=brisque)
+
+
+def watch(folder: str, store: MetricsStore, workers: int = 1, brisque: bool = True,
+          debounce: float = DEFAULT_DEBOUNCE, poll: bool = False, interval: float = 1.0,
+          existing: bool = False, flush_rows: int = 50, flush_seconds: float = 5.0,
+          duration: Optional[float] = None) -> int:
+    """Score images written to ``folder`` until interrupted (or ``duration`` elapses).
+
+    Returns the number of images scored.
+    """
+    watcher = None
+    if not poll and load_inotify() is not None:
+        try:
+            watcher = InotifyWatcher(folder)
+        except OSError as exc:
+            print(f"inotify unavailable ({exc}), polling instead")
+    if watcher is None:
+        watcher = PollingWatcher(folder, interval)
+    print(f"Watching {folder} with {type(watcher).__name__}, {workers} workers")
+
+    debouncer = Debouncer(debounce)
+    if existing:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file() and is_image(entry.name):
+                    debouncer.touch(entry.path, time.time() - debounce)
+
+    done: "queue.Queue" = queue.Queue()
+    buffer: List[dict] = []
+    last_flush = time.time()
+    scored = 0
+    in_flight = 0
+    end = time.time() + duration if duration else None
+    tick = min(debounce / 2.0, interval) if debounce > 0 else interval
+
+    def flush() -> None:
+        nonlocal buffer, last_flush
+        if buffer:
+            store.append(buffer, source=f"watch:{folder}")
+            buffer = []
+        last_flush = time.time()
+
+    pool = mp.Pool(workers, initializer=_init_worker, initargs=(brisque,))
+    try:
+        while end is None or time.time() < end:
+            for path in watcher.events(tick if len(debouncer) or in_flight else interval):
+                if is_image(path):
+                    debouncer.touch(path, time.time())
+            for path in debouncer.ready(time.time()):
+                written = _stat(path)
+                mtime = written[1] / 1e9 if written else time.time()
+                pool.apply_async(
+                    _score,
+                    (path, brisque),
+                    callback=lambda res, p=path, m=mtime: done.put((p, m, res, None)),
+                    error_callback=lambda exc, p=path, m=mtime: done.put((p, m, None, str(exc))),
+                )
+                in_flight += 1
+            while True:
+                try:
+                    path, mtime, res, err = done.get_nowait()
+                except queue.Empty:
+                    break
+                in_flight -= 1
+                latency = time.time() - mtime
+                if err is not None:
+                    print(f"Error processing {path}: {err}")
+                    continue
+                failed = failed_checks(res)
+                print(f"{path}: {', '.join(failed) if failed else 'OK'} "
+                      f"(latency {latency:.2f}s, scoring {res['ElapsedMs']:.0f} ms)")
+                buffer.append(res)
+                scored += 1
+            if len(buffer) >= flush_rows or (buffer and time.time() - last_flush >= flush_seconds):
+                flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+        pool.join()
+        while not done.empty():
+            path, _, res, err = done.get()
+            if err is None:
+                buffer.append(res)
+                scored += 1
+        flush()
+        watcher.close()
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score images as they arrive in a folder")
+    parser.add_argument("folder", help="Hot folder to watch")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Metrics store directory to append to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-brisque", action="store_true")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help="Seconds a file must stay unchanged before it is scored")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    parser.add_argument("--interval", type=float, default=1.0, help="Polling interval in seconds")
+    parser.add_argument("--existing", action="store_true", help="Also score images already in the folder")
+    parser.add_argument("--flush-rows", type=int, default=50, help="Append to the store every N results")
+    parser.add_argument("--flush-seconds", type=float, default=5.0, help="... or after this many seconds")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    args = parser.parse_args()
+
+    store = MetricsStore(args.store)
+    scored = watch(args.folder, store, args.workers, brisque=not args.no_brisque, debounce=args.debounce,
+                   poll=args.poll, interval=args.interval, existing=args.existing,
+                   flush_rows=args.flush_rows, flush_seconds=args.flush_seconds, duration=args.duration)
+    print(f"Scored {scored} images, store has {store.rows} rows")
+
+
+if __name__ == "__main__":
+    main()
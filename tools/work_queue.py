@@ -0,0 +1,351 @@
+"""Lease-based work queue for scoring across several machines.
+
+Paths are enqueued in chunks. A worker claims a chunk with a lease, renews it
+with heartbeats while scoring, and completes it when the results are
+written. A chunk whose lease expires (crashed or partitioned node) becomes
+claimable again, up to ``max_attempts`` claims. Paths that fail to score are
+re-enqueued as a new chunk that keeps the attempt count.
+
+Results are written per chunk (``chunk-<id>.csv``) through a temporary file
+and an atomic rename, so a chunk processed twice leaves one copy; ``export``
+merges the chunk files into the usual metrics CSV keeping one row per path.
+
+``SQLiteWorkQueue`` is the file-backed implementation for a single host (or a
+shared filesystem with working locks) and for tests; other brokers plug in by
+subclassing ``WorkQueue`` and calling ``register_backend``.
+
+Usage::
+
+    python tools/work_queue.py --queue sqlite:///data/queue.db enqueue --sample data/sample_50.txt
+    python tools/work_queue.py --queue sqlite:///data/queue.db work --results-dir reports/chunks
+    python tools/work_queue.py --queue sqlite:///data/queue.db status
+    python tools/work_queue.py --queue sqlite:///data/queue.db export --results-dir reports/chunks
+"""
+import abc
+import argparse
+import glob
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Allow importing compute_metrics from same directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from compute_metrics_py import compute_metrics, read_paths  # noqa: E402
+
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+@dataclass
+class Chunk:
+    id: int
+    paths: List[str]
+    attempts: int
+
+
+class WorkQueue(abc.ABC):
+    """Interface shared by all queue backends."""
+
+    @abc.abstractmethod
+    def enqueue(self, paths: Sequence[str], chunk_size: int = 100, attempts: int = 0) -> int:
+        """Add ``paths`` split into chunks; returns the number of chunks."""
+
+    @abc.abstractmethod
+    def claim(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Chunk]:
+        """Lease the next pending or expired chunk to ``worker``."""
+
+    @abc.abstractmethod
+    def heartbeat(self, chunk_id: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend the lease; ``False`` when ``worker`` no longer holds it."""
+
+    @abc.abstractmethod
+    def complete(self, chunk_id: int, worker: str, failed: Sequence[str] = ()) -> bool:
+        """Mark the chunk done and re-enqueue the ``failed`` paths."""
+
+    @abc.abstractmethod
+    def fail(self, chunk_id: int, worker: str, error: str) -> None:
+        """Release the chunk for another attempt, or give up after too many."""
+
+    @abc.abstractmethod
+    def status(self) -> Dict[str, int]:
+        """Number of chunks per state."""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Work queue stored in a SQLite database file."""
+
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                paths TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS chunks_state ON chunks(state, lease_until);
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], object]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def enqueue(self, paths: Sequence[str], chunk_size: int = 100, attempts: int = 0) -> int:
+        rows = [
+            (json.dumps(list(paths[i:i + chunk_size])), attempts)
+            for i in range(0, len(paths), chunk_size)
+        ]
+        self._transaction(lambda c: c.executemany("INSERT INTO chunks (paths, attempts) VALUES (?, ?)", rows))
+        return len(rows)
+
+    def claim(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Chunk]:
+        def _claim(conn: sqlite3.Connection) -> Optional[Chunk]:
+            now = time.time()
+            conn.execute(
+                "UPDATE chunks SET state = 'failed', error = 'lease expired too many times' "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, paths, attempts FROM chunks "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE chunks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker, now + lease_seconds, row[0]),
+            )
+            return Chunk(row[0], json.loads(row[1]), row[2] + 1)
+
+        return self._transaction(_claim)
+
+    def heartbeat(self, chunk_id: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        cur = self._conn().execute(
+            "UPDATE chunks SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+            (time.time() + lease_seconds, chunk_id, worker),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, chunk_id: int, worker: str, failed: Sequence[str] = ()) -> bool:
+        def _complete(conn: sqlite3.Connection) -> bool:
+            row = conn.execute(
+                "SELECT attempts FROM chunks WHERE id = ? AND worker = ? AND state = 'leased'",
+                (chunk_id, worker),
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("UPDATE chunks SET state = 'done', lease_until = NULL WHERE id = ?", (chunk_id,))
+            if failed:
+                state = "pending" if row[0] < self.max_attempts else "failed"
+                conn.execute(
+                    "INSERT INTO chunks (paths, state, attempts, error) VALUES (?, ?, ?, ?)",
+                    (json.dumps(list(failed)), state, row[0], f"{len(failed)} paths failed in chunk {chunk_id}"),
+                )
+            return True
+
+        return self._transaction(_complete)
+
+    def fail(self, chunk_id: int, worker: str, error: str) -> None:
+        self._conn().execute(
+            "UPDATE chunks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_until = NULL, error = ? "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (self.max_attempts, error, chunk_id, worker),
+        )
+
+    def status(self) -> Dict[str, int]:
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        for state, count in self._conn().execute("SELECT state, COUNT(*) FROM chunks GROUP BY state"):
+            counts[state] = count
+        return counts
+
+    def failed_chunks(self) -> List[Chunk]:
+        rows = self._conn().execute("SELECT id, paths, attempts FROM chunks WHERE state = 'failed'")
+        return [Chunk(r[0], json.loads(r[1]), r[2]) for r in rows]
+
+    def requeue_failed(self) -> int:
+        cur = self._conn().execute(
+            "UPDATE chunks SET state = 'pending', attempts = 0, worker = NULL, lease_until = NULL "
+            "WHERE state = 'failed'"
+        )
+        return cur.rowcount
+
+
+QUEUE_BACKENDS: Dict[str, Callable[[str], WorkQueue]] = {"sqlite": SQLiteWorkQueue}
+
+
+def register_backend(scheme: str, factory: Callable[[str], WorkQueue]) -> None:
+    """Make ``scheme://...`` URLs open a queue created by ``factory(location)``."""
+    QUEUE_BACKENDS[scheme] = factory
+
+
+def open_queue(url: str) -> WorkQueue:
+    """Open ``scheme://location``; a bare path is treated as a SQLite file."""
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        return SQLiteWorkQueue(url)
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"Unknown queue backend: {scheme}")
+    if scheme == "sqlite" and location.startswith("/"):
+        location = location[1:]  # sqlite:///relative.db, sqlite:////abs/path.db
+    return QUEUE_BACKENDS[scheme](location)
+
+
+def write_results(results_dir: str, chunk_id: int, records: List[dict]) -> str:
+    """Atomically write the results of a chunk; rewriting a chunk replaces it."""
+    import pandas as pd
+
+    os.makedirs(results_dir, exist_ok=True)
+    final = os.path.join(results_dir, f"chunk-{chunk_id:08d}.csv")
+    tmp = f"{final}.{uuid.uuid4().hex}.tmp"
+    pd.DataFrame(records).to_csv(tmp, index=False)
+    os.replace(tmp, final)
+    return final
+
+
+def run_worker(queue: WorkQueue, results_dir: str, worker: Optional[str] = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_seconds: float = 5.0,
+               score: Callable[[str], dict] = compute_metrics) -> int:
+    """Claim and score chunks until the queue is drained; returns chunks completed."""
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    completed = 0
+    while True:
+        chunk = queue.claim(worker, lease_seconds)
+        if chunk is None:
+            counts = queue.status()
+            if counts["pending"] == 0 and counts["leased"] == 0:
+                return completed
+            time.sleep(poll_seconds)  # wait for other leases to finish or expire
+            continue
+
+        lost = threading.Event()
+        stop = threading.Event()
+
+        def _beat(chunk_id=chunk.id):
+            while not stop.wait(lease_seconds / 3.0):
+                if not queue.heartbeat(chunk_id, worker, lease_seconds):
+                    lost.set()
+                    return
+
+        beat = threading.Thread(target=_beat, daemon=True)
+        beat.start()
+        records, failed = [], []
+        try:
+            for path in chunk.paths:
+                if lost.is_set():
+                    break
+                try:
+                    records.append(score(path))
+                except Exception as exc:  # pragma: no cover
+                    print(f"Error processing {path}: {exc}")
+                    failed.append(path)
+            if lost.is_set():
+                print(f"Lease on chunk {chunk.id} lost, abandoning it")
+                continue
+            if records:
+                write_results(results_dir, chunk.id, records)
+            if queue.complete(chunk.id, worker, failed):
+                completed += 1
+        except Exception as exc:
+            queue.fail(chunk.id, worker, str(exc))
+            raise
+        finally:
+            stop.set()
+            beat.join()
+
+
+def export_results(results_dir: str, output: str) -> int:
+    """Merge chunk result files into one metrics CSV, one row per path."""
+    import pandas as pd
+
+    files = sorted(glob.glob(os.path.join(results_dir, "chunk-*.csv")))
+    frames = [pd.read_csv(f) for f in files if os.path.getsize(f) > 0]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not df.empty:
+        df = df.drop_duplicates("path", keep="last")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    df.to_csv(output, index=False)
+    return len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed scoring with a lease-based work queue")
+    parser.add_argument("--queue", default="sqlite:///data/work_queue.db", help="Queue URL")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enq = sub.add_parser("enqueue", help="Add the paths of a sample list")
+    enq.add_argument("--sample", default=os.path.join("data", "sample_50.txt"))
+    enq.add_argument("--chunk-size", type=int, default=100)
+
+    work = sub.add_parser("work", help="Run a worker until the queue is drained")
+    work.add_argument("--results-dir", default=os.path.join("reports", "chunks"))
+    work.add_argument("--worker-id", default=None)
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length in seconds")
+    work.add_argument("--poll", type=float, default=5.0, help="Seconds between claims while others hold leases")
+
+    sub.add_parser("status", help="Show chunk counts per state")
+    sub.add_parser("requeue-failed", help="Reset failed chunks to pending")
+
+    export = sub.add_parser("export", help="Merge chunk results into one CSV")
+    export.add_argument("--results-dir", default=os.path.join("reports", "chunks"))
+    export.add_argument("--output", default=os.path.join("reports", "metrics_per_image_py.csv"))
+    args = parser.parse_args()
+
+    queue = open_queue(args.queue)
+    if args.command == "enqueue":
+        count = queue.enqueue(read_paths(args.sample), args.chunk_size)
+        print(f"Enqueued {count} chunks")
+    elif args.command == "work":
+        start = time.time()
+        done = run_worker(queue, args.results_dir, args.worker_id, args.lease, args.poll)
+        print(f"Completed {done} chunks in {time.time() - start:.1f}s")
+    elif args.command == "status":
+        print(json.dumps(queue.status()))
+    elif args.command == "requeue-failed":
+        if not isinstance(queue, SQLiteWorkQueue):
+            parser.error("requeue-failed is only available for the sqlite backend")
+        print(f"Requeued {queue.requeue_failed()} chunks")
+    else:
+        rows = export_results(args.results_dir, args.output)
+        print(f"Exported {rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()